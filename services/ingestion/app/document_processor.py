@@ -64,7 +64,7 @@ class DocumentProcessor:
             )
             response.raise_for_status()
             
-            logger.info(f"Document indexed successfully: {metadata.get('filename', 'unknown')}")
+            logger.info(f"Document queued for indexing: {metadata.get('filename', 'unknown')}")
         
         except Exception as e:
             logger.error(f"Error indexing document: {e}")
@@ -3,20 +3,27 @@ LLM Gateway Service for Jarvis
 Provides unified interface for multiple LLM providers with fallback support
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from collections import OrderedDict
 import os
+import asyncio
+import time
+import orjson
+import hashlib
 import logging
-from openai import OpenAI
+from openai import AsyncOpenAI
+import openai
 import httpx
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Jarvis LLM Gateway", version="1.0.0")
-
 # Configuration from environment variables
 PRIMARY_PROVIDER = os.getenv("PRIMARY_LLM_PROVIDER", "openai")  # openai, ollama
 PRIMARY_MODEL = os.getenv("PRIMARY_LLM_MODEL", "gpt-4.1-mini")
@@ -25,8 +32,54 @@ FALLBACK_MODEL = os.getenv("FALLBACK_LLM_MODEL", "llama3.1")
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://llama:11434")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
-# Initialize OpenAI client (works with OpenAI-compatible APIs)
-openai_client = OpenAI() if OPENAI_API_KEY else None
+# Response cache for repeated, (near-)deterministic prompts
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_MAX_TEMPERATURE = float(os.getenv("RESPONSE_CACHE_MAX_TEMPERATURE", "0.2"))
+
+# Retries for transient upstream errors and per-provider circuit breaker
+PROVIDER_MAX_ATTEMPTS = int(os.getenv("PROVIDER_MAX_ATTEMPTS", "3"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# OpenAI client (works with OpenAI-compatible APIs), created in lifespan
+openai_client: Optional[AsyncOpenAI] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global openai_client
+    
+    # One pooled client for all upstream calls, so keep-alive connections are reused
+    # HTTP/2 is negotiated via ALPN on TLS upstreams; plain-http hosts like Ollama stay on HTTP/1.1
+    app.state.http = httpx.AsyncClient(
+        timeout=httpx.Timeout(120.0, connect=2.0),
+        limits=httpx.Limits(
+            max_keepalive_connections=20,
+            max_connections=100,
+            keepalive_expiry=30.0
+        ),
+        http2=True,
+        follow_redirects=False
+    )
+    
+    # The async SDK shares the pooled client and does not block the event loop
+    if OPENAI_API_KEY:
+        # Retries are handled by call_with_resilience, not by the SDK
+        openai_client = AsyncOpenAI(http_client=app.state.http, timeout=120.0, max_retries=0)
+    
+    yield
+    
+    await app.state.http.aclose()
+
+
+app = FastAPI(
+    title="Jarvis LLM Gateway",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 
 class Message(BaseModel):
@@ -49,6 +102,65 @@ class ChatResponse(BaseModel):
     usage: Optional[Dict[str, int]] = None
 
 
+class CircuitBreaker:
+    """
+    Minimal in-process circuit breaker.
+    Opens after a number of consecutive failures, rejects calls while open and
+    lets a single trial call through once the reset timeout has passed.
+    """
+    
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+    
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+    
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit breaker for {self.name} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    if provider not in circuit_breakers:
+        circuit_breakers[provider] = CircuitBreaker(provider, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+    return circuit_breakers[provider]
+
+
+# Request bodies are pre-serialized with orjson and sent as raw content
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
 async def call_openai_api(messages: List[Dict], temperature: float, max_tokens: int, tools: Optional[List[Dict]] = None) -> Dict:
     """Call OpenAI or OpenAI-compatible API"""
     try:
@@ -68,7 +180,7 @@ async def call_openai_api(messages: List[Dict], temperature: float, max_tokens:
         if tools:
             params["tools"] = tools
         
-        response = openai_client.chat.completions.create(**params)
+        response = await openai_client.chat.completions.create(**params)
         
         return {
             "content": response.choices[0].message.content or "",
@@ -87,52 +199,234 @@ async def call_openai_api(messages: List[Dict], temperature: float, max_tokens:
 
 
 async def call_ollama_api(messages: List[Dict], temperature: float, max_tokens: int) -> Dict:
-    """Call Ollama API"""
+    """Call Ollama chat API, which applies the model's own chat template"""
     try:
         logger.info(f"Calling Ollama API with model: {FALLBACK_MODEL}")
         
-        # Convert messages to Ollama format
-        prompt = ""
-        for msg in messages:
-            role = msg["role"]
-            content = msg["content"]
-            if role == "system":
-                prompt += f"System: {content}\n\n"
-            elif role == "user":
-                prompt += f"User: {content}\n\n"
-            elif role == "assistant":
-                prompt += f"Assistant: {content}\n\n"
-        
-        prompt += "Assistant: "
-        
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{OLLAMA_URL}/api/generate",
-                json={
-                    "model": FALLBACK_MODEL,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": temperature,
-                        "num_predict": max_tokens,
-                    }
+        response = await app.state.http.post(
+            f"{OLLAMA_URL}/api/chat",
+            content=orjson.dumps({
+                "model": FALLBACK_MODEL,
+                "messages": messages,
+                "stream": False,
+                "options": {
+                    "temperature": temperature,
+                    "num_predict": max_tokens,
                 }
-            )
-            response.raise_for_status()
-            result = response.json()
+            }),
+            headers=JSON_HEADERS
+        )
+        response.raise_for_status()
+        result = orjson.loads(response.content)
+        
+        usage = None
+        if "prompt_eval_count" in result or "eval_count" in result:
+            prompt_tokens = result.get("prompt_eval_count", 0)
+            completion_tokens = result.get("eval_count", 0)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
         
         return {
-            "content": result.get("response", ""),
+            "content": result.get("message", {}).get("content", ""),
             "model": FALLBACK_MODEL,
             "provider": "ollama",
-            "finish_reason": "stop",
-            "usage": None
+            "finish_reason": result.get("done_reason", "stop"),
+            "usage": usage
         }
     except Exception as e:
         logger.error(f"Ollama API error: {str(e)}")
         raise
 
 
+# key -> (expires_at, ChatResponse), kept in LRU order
+_response_cache: "OrderedDict[str, tuple[float, ChatResponse]]" = OrderedDict()
+
+# key -> upstream call currently running for that key
+_inflight_requests: Dict[str, "asyncio.Task[ChatResponse]"] = {}
+
+
+def is_cacheable(request: ChatRequest) -> bool:
+    """Only cache low-temperature requests without tools"""
+    return (
+        RESPONSE_CACHE_SIZE > 0
+        and not request.tools
+        and (request.temperature or 0.0) <= RESPONSE_CACHE_MAX_TEMPERATURE
+    )
+
+
+def get_cache_key(messages: List[Dict], request: ChatRequest) -> str:
+    """Hash the canonicalized messages together with the generation settings"""
+    canonical = orjson.dumps(
+        {
+            "messages": [
+                {"role": m["role"], "content": " ".join(m["content"].split())}
+                for m in messages
+            ],
+            "temperature": request.temperature,
+            "max_tokens": request.max_tokens,
+        },
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return hashlib.sha256(canonical).hexdigest()
+
+
+def get_cached_response(key: str) -> Optional[ChatResponse]:
+    entry = _response_cache.get(key)
+    if entry is None:
+        return None
+    
+    expires_at, response = entry
+    if time.monotonic() >= expires_at:
+        del _response_cache[key]
+        return None
+    
+    _response_cache.move_to_end(key)
+    return response
+
+
+def cache_response(key: str, response: ChatResponse):
+    _response_cache[key] = (time.monotonic() + RESPONSE_CACHE_TTL, response)
+    _response_cache.move_to_end(key)
+    while len(_response_cache) > RESPONSE_CACHE_SIZE:
+        _response_cache.popitem(last=False)
+
+
+async def stream_openai_api(messages: List[Dict], temperature: float, max_tokens: int) -> AsyncIterator[str]:
+    """Stream content deltas from OpenAI or OpenAI-compatible API"""
+    if not openai_client:
+        raise ValueError("OpenAI client not initialized - API key missing")
+    
+    logger.info(f"Streaming from OpenAI API with model: {PRIMARY_MODEL}")
+    
+    stream = await openai_client.chat.completions.create(
+        model=PRIMARY_MODEL,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=True
+    )
+    
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def stream_ollama_api(messages: List[Dict], temperature: float, max_tokens: int) -> AsyncIterator[str]:
+    """Stream response tokens from Ollama API"""
+    logger.info(f"Streaming from Ollama API with model: {FALLBACK_MODEL}")
+    
+    async with app.state.http.stream(
+        "POST",
+        f"{OLLAMA_URL}/api/chat",
+        content=orjson.dumps({
+            "model": FALLBACK_MODEL,
+            "messages": messages,
+            "stream": True,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens,
+            }
+        }),
+        headers=JSON_HEADERS
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            
+            data = orjson.loads(line)
+            content = data.get("message", {}).get("content")
+            if content:
+                yield content
+            if data.get("done"):
+                break
+
+
+async def open_stream(provider: str, messages: List[Dict], request: ChatRequest) -> tuple[AsyncIterator[str], str]:
+    """
+    Start streaming from a provider and wait for the first chunk,
+    so that connection errors surface before the response is sent
+    """
+    if provider == "openai":
+        chunks = stream_openai_api(messages, request.temperature, request.max_tokens)
+    elif provider == "ollama":
+        chunks = stream_ollama_api(messages, request.temperature, request.max_tokens)
+    else:
+        raise ValueError(f"Unknown provider: {provider}")
+    
+    try:
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        first_chunk = ""
+    
+    return chunks, first_chunk
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Transient upstream errors that are worth retrying on the same provider"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, openai.APIConnectionError))
+
+
+async def call_with_resilience(provider: str, call: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run a provider call with jittered exponential backoff on transient errors,
+    guarded by the provider's circuit breaker
+    """
+    breaker = get_circuit_breaker(provider)
+    if not breaker.allow_request():
+        raise RuntimeError(f"Circuit breaker open for provider {provider}")
+    
+    try:
+        async for attempt in AsyncRetrying(
+            retry=retry_if_exception(is_retryable_error),
+            wait=wait_random_exponential(multiplier=0.2, max=4),
+            stop=stop_after_attempt(PROVIDER_MAX_ATTEMPTS),
+            reraise=True
+        ):
+            with attempt:
+                result = await call()
+    except asyncio.CancelledError:
+        # A cancelled client request says nothing about the provider's health
+        breaker.trial_in_flight = False
+        raise
+    except Exception as e:
+        if is_retryable_error(e):
+            breaker.record_failure()
+        else:
+            # Errors caused by the request itself (400, 422, ...) say nothing about the provider's health
+            breaker.trial_in_flight = False
+        raise
+    
+    breaker.record_success()
+    return result
+
+
+async def call_provider(provider: str, messages: List[Dict], request: ChatRequest) -> Dict:
+    """Dispatch a buffered chat call to the given provider"""
+    if provider == "openai":
+        return await call_openai_api(
+            messages=messages,
+            temperature=request.temperature,
+            max_tokens=request.max_tokens,
+            tools=request.tools
+        )
+    elif provider == "ollama":
+        return await call_ollama_api(
+            messages=messages,
+            temperature=request.temperature,
+            max_tokens=request.max_tokens
+        )
+    else:
+        raise ValueError(f"Unknown provider: {provider}")
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -142,7 +436,8 @@ async def health_check():
         "primary_model": PRIMARY_MODEL,
         "fallback_provider": FALLBACK_PROVIDER,
         "fallback_model": FALLBACK_MODEL,
-        "openai_configured": openai_client is not None
+        "openai_configured": openai_client is not None,
+        "circuit_breakers": {name: breaker.state for name, breaker in circuit_breakers.items()}
     }
 
 
@@ -152,59 +447,137 @@ async def chat(request: ChatRequest):
     Unified chat endpoint with automatic fallback
     Tries primary provider first, falls back to secondary on failure
     """
-    # Convert Pydantic models to dicts
-    messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+    # Convert Pydantic models to dicts (done by pydantic-core's serializer)
+    messages = request.model_dump(include={"messages"})["messages"]
+    return await handle_chat(messages, request)
+
+
+@app.post("/internal/chat")
+async def internal_chat(request: Request):
+    """
+    Chat endpoint for trusted internal callers such as the orchestrator.
+    Same caching and fallback as /v1/chat, but the body is decoded with orjson
+    without Pydantic validation and the response is encoded directly.
+    """
+    try:
+        data = orjson.loads(await request.body())
+        messages = data["messages"]
+        chat_request = ChatRequest.model_construct(**data)
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid chat request")
+    
+    response = await handle_chat(messages, chat_request)
+    return ORJSONResponse(response.model_dump())
+
+
+async def handle_chat(messages: List[Dict], request: ChatRequest) -> ChatResponse:
+    """Serve a chat request from the response cache or the providers"""
+    cache_key = None
+    if is_cacheable(request):
+        cache_key = get_cache_key(messages, request)
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            logger.info("Serving chat response from cache")
+            return cached
     
+    if cache_key is None:
+        return await chat_with_fallback(messages, request)
+    
+    # Coalesce concurrent identical requests onto a single upstream call
+    task = _inflight_requests.get(cache_key)
+    if task is None:
+        task = asyncio.create_task(fetch_and_cache(cache_key, messages, request))
+        _inflight_requests[cache_key] = task
+        task.add_done_callback(lambda _: _inflight_requests.pop(cache_key, None))
+    
+    # Shield so a disconnecting client does not cancel the call for the other waiters
+    return await asyncio.shield(task)
+
+
+async def fetch_and_cache(key: str, messages: List[Dict], request: ChatRequest) -> ChatResponse:
+    response = await chat_with_fallback(messages, request)
+    cache_response(key, response)
+    return response
+
+
+async def chat_with_fallback(messages: List[Dict], request: ChatRequest) -> ChatResponse:
+    """Try the primary provider first, fall back to the secondary on failure"""
     # Try primary provider
     try:
-        if PRIMARY_PROVIDER == "openai":
-            result = await call_openai_api(
-                messages=messages,
-                temperature=request.temperature,
-                max_tokens=request.max_tokens,
-                tools=request.tools
+        result = await call_with_resilience(
+            PRIMARY_PROVIDER,
+            lambda: call_provider(PRIMARY_PROVIDER, messages, request)
+        )
+        return ChatResponse(**result)
+    
+    except Exception as primary_error:
+        logger.warning(f"Primary provider ({PRIMARY_PROVIDER}) failed: {str(primary_error)}")
+        logger.info(f"Falling back to {FALLBACK_PROVIDER}")
+        
+        # Try fallback provider
+        try:
+            result = await call_with_resilience(
+                FALLBACK_PROVIDER,
+                lambda: call_provider(FALLBACK_PROVIDER, messages, request)
             )
             return ChatResponse(**result)
-        elif PRIMARY_PROVIDER == "ollama":
-            result = await call_ollama_api(
-                messages=messages,
-                temperature=request.temperature,
-                max_tokens=request.max_tokens
+        
+        except Exception as fallback_error:
+            logger.error(f"Fallback provider ({FALLBACK_PROVIDER}) also failed: {str(fallback_error)}")
+            raise HTTPException(
+                status_code=503,
+                detail=f"All LLM providers failed. Primary: {str(primary_error)}, Fallback: {str(fallback_error)}"
             )
-            return ChatResponse(**result)
-        else:
-            raise ValueError(f"Unknown primary provider: {PRIMARY_PROVIDER}")
+
+
+@app.post("/v1/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming chat endpoint (Server-Sent Events)
+    Each event carries a JSON object with a content delta, the stream ends with [DONE].
+    Falls back to the secondary provider if the primary fails before the first chunk.
+    """
+    messages = request.model_dump(include={"messages"})["messages"]
     
+    provider = PRIMARY_PROVIDER
+    try:
+        chunks, first_chunk = await call_with_resilience(
+            provider,
+            lambda: open_stream(provider, messages, request)
+        )
     except Exception as primary_error:
         logger.warning(f"Primary provider ({PRIMARY_PROVIDER}) failed: {str(primary_error)}")
         logger.info(f"Falling back to {FALLBACK_PROVIDER}")
         
-        # Try fallback provider
+        provider = FALLBACK_PROVIDER
         try:
-            if FALLBACK_PROVIDER == "ollama":
-                result = await call_ollama_api(
-                    messages=messages,
-                    temperature=request.temperature,
-                    max_tokens=request.max_tokens
-                )
-                return ChatResponse(**result)
-            elif FALLBACK_PROVIDER == "openai":
-                result = await call_openai_api(
-                    messages=messages,
-                    temperature=request.temperature,
-                    max_tokens=request.max_tokens,
-                    tools=request.tools
-                )
-                return ChatResponse(**result)
-            else:
-                raise ValueError(f"Unknown fallback provider: {FALLBACK_PROVIDER}")
-        
+            chunks, first_chunk = await call_with_resilience(
+                provider,
+                lambda: open_stream(provider, messages, request)
+            )
         except Exception as fallback_error:
             logger.error(f"Fallback provider ({FALLBACK_PROVIDER}) also failed: {str(fallback_error)}")
             raise HTTPException(
                 status_code=503,
                 detail=f"All LLM providers failed. Primary: {str(primary_error)}, Fallback: {str(fallback_error)}"
             )
+    
+    async def event_stream():
+        try:
+            if first_chunk:
+                yield b"data: " + orjson.dumps({"content": first_chunk}) + b"\n\n"
+            async for chunk in chunks:
+                yield b"data: " + orjson.dumps({"content": chunk}) + b"\n\n"
+        except Exception as e:
+            logger.error(f"Streaming from {provider} failed: {str(e)}")
+            yield b"data: " + orjson.dumps({"error": str(e)}) + b"\n\n"
+        yield b"data: [DONE]\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"X-LLM-Provider": provider}
+    )
 
 
 @app.get("/v1/models")
@@ -1,6 +1,8 @@
 import os
-import requests
-import json
+import asyncio
+import time
+import httpx
+import orjson
 import re
 from typing import Dict, List, Optional, Any
 
@@ -15,26 +17,64 @@ OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1")
 SYSTEM_PROMPT_PATH = "/app/config/system_prompt.txt"
 PERSONA_PROMPT_PATH = "/app/config/persona_prompt.txt"
 
+# Timeouts per call class: quick toolserver lookups, slower toolserver work, LLM generation
+TOOLSERVER_FAST_TIMEOUT = httpx.Timeout(5.0, connect=1.0)
+TOOLSERVER_TIMEOUT = httpx.Timeout(10.0, connect=1.0)
+LLM_GATEWAY_TIMEOUT = httpx.Timeout(120.0, connect=2.0)
+OLLAMA_TIMEOUT = httpx.Timeout(60.0, connect=2.0)
+
+# Shared client so toolserver/gateway calls reuse pooled keep-alive connections.
+# All upstreams are internal services, so proxy settings from the environment are ignored.
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+    http2=True,
+    follow_redirects=False,
+    trust_env=False
+)
+
+# Tool list and learning context change rarely, so they are cached for a short time
+CACHE_TTL_SECONDS = float(os.getenv("ORCHESTRATOR_CACHE_TTL", "30"))
+
+_prompt_cache: Dict[str, Any] = {"mtimes": None, "value": None}
+_tools_cache: Dict[str, Any] = {"value": None, "expires": 0.0}
+_learning_context_cache: Dict[str, Any] = {"value": None, "expires": 0.0}
+
 def load_prompts() -> tuple[str, str]:
+    # Only re-read the prompt files when they were modified on disk
+    mtimes = (
+        os.stat(SYSTEM_PROMPT_PATH).st_mtime,
+        os.stat(PERSONA_PROMPT_PATH).st_mtime
+    )
+    if _prompt_cache["mtimes"] == mtimes:
+        return _prompt_cache["value"]
+    
     with open(SYSTEM_PROMPT_PATH, "r", encoding="utf-8") as f:
         system_prompt = f.read()
     
     with open(PERSONA_PROMPT_PATH, "r", encoding="utf-8") as f:
         persona_prompt = f.read()
     
+    _prompt_cache["mtimes"] = mtimes
+    _prompt_cache["value"] = (system_prompt, persona_prompt)
     return system_prompt, persona_prompt
 
-def get_available_tools() -> List[Dict[str, Any]]:
+async def get_available_tools() -> List[Dict[str, Any]]:
+    if _tools_cache["value"] is not None and time.monotonic() < _tools_cache["expires"]:
+        return _tools_cache["value"]
+    
     try:
-        response = requests.get(f"{TOOLSERVER_URL}/v1/tools", timeout=5)
+        response = await http_client.get(f"{TOOLSERVER_URL}/v1/tools", timeout=TOOLSERVER_FAST_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
-        return data.get("tools", [])
+        data = orjson.loads(response.content)
+        tools = data.get("tools", [])
+        _tools_cache["value"] = tools
+        _tools_cache["expires"] = time.monotonic() + CACHE_TTL_SECONDS
+        return tools
     except Exception as e:
         print(f"Error fetching tools: {e}")
         return []
 
-def call_llm_gateway(messages: List[Dict[str, str]]) -> Dict[str, Any]:
+async def call_llm_gateway(messages: List[Dict[str, str]]) -> Dict[str, Any]:
     """Call the new LLM Gateway service"""
     try:
         payload = {
@@ -43,14 +83,16 @@ def call_llm_gateway(messages: List[Dict[str, str]]) -> Dict[str, Any]:
             "max_tokens": 2000
         }
         
-        response = requests.post(
-            f"{LLM_GATEWAY_URL}/v1/chat",
-            json=payload,
-            timeout=120
+        # Trusted internal endpoint: pre-serialized body, no request validation on the gateway
+        response = await http_client.post(
+            f"{LLM_GATEWAY_URL}/internal/chat",
+            content=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"},
+            timeout=LLM_GATEWAY_TIMEOUT
         )
         response.raise_for_status()
         
-        result = response.json()
+        result = orjson.loads(response.content)
         return {
             "content": result.get("content", ""),
             "model": result.get("model", "unknown"),
@@ -61,7 +103,7 @@ def call_llm_gateway(messages: List[Dict[str, str]]) -> Dict[str, Any]:
         print(f"Error calling LLM Gateway: {e}")
         raise
 
-def call_ollama(messages: List[Dict[str, str]]) -> str:
+async def call_ollama(messages: List[Dict[str, str]]) -> str:
     """Legacy Ollama call (for backward compatibility)"""
     try:
         payload = {
@@ -70,28 +112,28 @@ def call_ollama(messages: List[Dict[str, str]]) -> str:
             "stream": False
         }
         
-        response = requests.post(
+        response = await http_client.post(
             f"{OLLAMA_URL}/api/chat",
             json=payload,
-            timeout=60
+            timeout=OLLAMA_TIMEOUT
         )
         response.raise_for_status()
         
-        result = response.json()
+        result = orjson.loads(response.content)
         return result.get("message", {}).get("content", "")
     
     except Exception as e:
         print(f"Error calling Ollama: {e}")
         return f"Fehler bei der LLM-Anfrage: {str(e)}"
 
-def call_llm(messages: List[Dict[str, str]]) -> tuple[str, Optional[Dict[str, str]]]:
+async def call_llm(messages: List[Dict[str, str]]) -> tuple[str, Optional[Dict[str, str]]]:
     """
     Unified LLM call function
     Returns: (response_text, metadata)
     """
     if USE_LLM_GATEWAY:
         try:
-            result = call_llm_gateway(messages)
+            result = await call_llm_gateway(messages)
             metadata = {
                 "model": result["model"],
                 "provider": result["provider"]
@@ -100,7 +142,7 @@ def call_llm(messages: List[Dict[str, str]]) -> tuple[str, Optional[Dict[str, st
         except Exception as e:
             print(f"LLM Gateway failed, falling back to direct Ollama: {e}")
             # Fallback to direct Ollama
-            response = call_ollama(messages)
+            response = await call_ollama(messages)
             metadata = {
                 "model": OLLAMA_MODEL,
                 "provider": "ollama_direct"
@@ -108,115 +150,108 @@ def call_llm(messages: List[Dict[str, str]]) -> tuple[str, Optional[Dict[str, st
             return response, metadata
     else:
         # Use legacy Ollama directly
-        response = call_ollama(messages)
+        response = await call_ollama(messages)
         metadata = {
             "model": OLLAMA_MODEL,
             "provider": "ollama_direct"
         }
         return response, metadata
 
-def parse_tool_calls(text: str) -> List[Dict[str, Any]]:
-    tool_call_pattern = r'<tool_call>(.*?)</tool_call>'
-    matches = re.findall(tool_call_pattern, text, re.DOTALL)
+TOOL_CALL_PATTERN = re.compile(r'<tool_call>(.*?)</tool_call>', re.DOTALL)
+
+# Legacy call syntax, e.g. get_fact("key"): function -> (pattern, argument names)
+LEGACY_TOOL_CALL_PATTERNS = {
+    "get_fact": (re.compile(r'get_fact\(["\'](.+?)["\']\)'), ("key",)),
+    "set_fact": (re.compile(r'set_fact\(["\'](.+?)["\']\s*,\s*["\'](.+?)["\']\)'), ("key", "value")),
+    "search_docs": (re.compile(r'search_docs\(["\'](.+?)["\']\)'), ("query",)),
+    "smarthome_list_devices": (re.compile(r'smarthome_list_devices\(["\'](.+?)["\']\)'), ("domain",)),
+    "smarthome_turn_on": (re.compile(r'smarthome_turn_on\(["\'](.+?)["\']\)'), ("entity_id",)),
+    "smarthome_turn_off": (re.compile(r'smarthome_turn_off\(["\'](.+?)["\']\)'), ("entity_id",)),
+    "smarthome_get_status": (re.compile(r'smarthome_get_status\(["\'](.+?)["\']\)'), ("entity_id",)),
+}
+
+def parse_json_tool_call(text: str) -> Optional[Dict[str, Any]]:
+    """Parse a tool call of the form {"function": "...", "args": {...}}"""
+    try:
+        data = orjson.loads(text)
+    except ValueError:
+        return None
+    
+    if not isinstance(data, dict):
+        return None
     
+    function = data.get("function")
+    args = data.get("args") or {}
+    if function not in LEGACY_TOOL_CALL_PATTERNS or not isinstance(args, dict):
+        return None
+    
+    return {"function": function, **args}
+
+def parse_legacy_tool_call(text: str) -> Optional[Dict[str, Any]]:
+    """Parse a tool call of the form get_fact("key")"""
+    function = text.partition("(")[0]
+    entry = LEGACY_TOOL_CALL_PATTERNS.get(function)
+    if not entry:
+        return None
+    
+    pattern, arg_names = entry
+    params_match = pattern.search(text)
+    if not params_match:
+        return None
+    
+    return {"function": function, **dict(zip(arg_names, params_match.groups()))}
+
+def parse_tool_calls(text: str) -> List[Dict[str, Any]]:
     tool_calls = []
-    for match in matches:
+    for match in TOOL_CALL_PATTERN.findall(text):
         match = match.strip()
         
-        if match.startswith("get_fact("):
-            key_match = re.search(r'get_fact\(["\'](.+?)["\']\)', match)
-            if key_match:
-                tool_calls.append({
-                    "function": "get_fact",
-                    "key": key_match.group(1)
-                })
-        
-        elif match.startswith("set_fact("):
-            params_match = re.search(r'set_fact\(["\'](.+?)["\']\s*,\s*["\'](.+?)["\']\)', match)
-            if params_match:
-                tool_calls.append({
-                    "function": "set_fact",
-                    "key": params_match.group(1),
-                    "value": params_match.group(2)
-                })
-        
-        elif match.startswith("search_docs("):
-            query_match = re.search(r'search_docs\(["\'](.+?)["\']\)', match)
-            if query_match:
-                tool_calls.append({
-                    "function": "search_docs",
-                    "query": query_match.group(1)
-                })
-        
-        elif match.startswith("smarthome_list_devices("):
-            domain_match = re.search(r'smarthome_list_devices\(["\'](.+?)["\']\)', match)
-            if domain_match:
-                tool_calls.append({
-                    "function": "smarthome_list_devices",
-                    "domain": domain_match.group(1)
-                })
-        
-        elif match.startswith("smarthome_turn_on("):
-            entity_match = re.search(r'smarthome_turn_on\(["\'](.+?)["\']\)', match)
-            if entity_match:
-                tool_calls.append({
-                    "function": "smarthome_turn_on",
-                    "entity_id": entity_match.group(1)
-                })
-        
-        elif match.startswith("smarthome_turn_off("):
-            entity_match = re.search(r'smarthome_turn_off\(["\'](.+?)["\']\)', match)
-            if entity_match:
-                tool_calls.append({
-                    "function": "smarthome_turn_off",
-                    "entity_id": entity_match.group(1)
-                })
+        # Prefer structured JSON, fall back to the legacy call syntax
+        if match.startswith("{"):
+            tool_call = parse_json_tool_call(match)
+        else:
+            tool_call = parse_legacy_tool_call(match)
         
-        elif match.startswith("smarthome_get_status("):
-            entity_match = re.search(r'smarthome_get_status\(["\'](.+?)["\']\)', match)
-            if entity_match:
-                tool_calls.append({
-                    "function": "smarthome_get_status",
-                    "entity_id": entity_match.group(1)
-                })
+        if tool_call:
+            tool_calls.append(tool_call)
     
     return tool_calls
 
-def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
+async def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
     function = tool_call.get("function")
     
     try:
         if function == "get_fact":
             key = tool_call.get("key")
-            response = requests.get(f"{TOOLSERVER_URL}/v1/facts/{key}", timeout=5)
+            response = await http_client.get(f"{TOOLSERVER_URL}/v1/facts/{key}", timeout=TOOLSERVER_FAST_TIMEOUT)
             
             if response.status_code == 404:
                 return {"success": False, "error": "Fakt nicht gefunden"}
             
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             return {"success": True, "result": data.get("value")}
         
         elif function == "set_fact":
             key = tool_call.get("key")
             value = tool_call.get("value")
-            response = requests.put(
+            response = await http_client.put(
                 f"{TOOLSERVER_URL}/v1/facts/{key}",
                 json={"value": value},
-                timeout=5
+                timeout=TOOLSERVER_FAST_TIMEOUT
             )
             response.raise_for_status()
             return {"success": True, "result": "Fakt gespeichert"}
         
         elif function == "search_docs":
             query = tool_call.get("query")
-            response = requests.post(
+            response = await http_client.post(
                 f"{TOOLSERVER_URL}/v1/search",
                 json={"query": query, "n_results": 3},
-                timeout=10
+                timeout=TOOLSERVER_TIMEOUT
             )
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             results = data.get("results", [])
             
             if results:
@@ -236,13 +271,13 @@ def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
         
         elif function == "smarthome_list_devices":
             domain = tool_call.get("domain")
-            response = requests.post(
+            response = await http_client.post(
                 f"{TOOLSERVER_URL}/v1/smarthome/list_devices",
                 json={"domain": domain},
-                timeout=10
+                timeout=TOOLSERVER_TIMEOUT
             )
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             if data.get("success"):
                 devices = data.get("devices", [])
@@ -261,13 +296,13 @@ def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
         
         elif function == "smarthome_turn_on":
             entity_id = tool_call.get("entity_id")
-            response = requests.post(
+            response = await http_client.post(
                 f"{TOOLSERVER_URL}/v1/smarthome/turn_on",
                 json={"entity_id": entity_id},
-                timeout=10
+                timeout=TOOLSERVER_TIMEOUT
             )
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             if data.get("success"):
                 return {"success": True, "result": data.get("message", f"{entity_id} eingeschaltet")}
@@ -276,13 +311,13 @@ def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
         
         elif function == "smarthome_turn_off":
             entity_id = tool_call.get("entity_id")
-            response = requests.post(
+            response = await http_client.post(
                 f"{TOOLSERVER_URL}/v1/smarthome/turn_off",
                 json={"entity_id": entity_id},
-                timeout=10
+                timeout=TOOLSERVER_TIMEOUT
             )
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             if data.get("success"):
                 return {"success": True, "result": data.get("message", f"{entity_id} ausgeschaltet")}
@@ -291,13 +326,13 @@ def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
         
         elif function == "smarthome_get_status":
             entity_id = tool_call.get("entity_id")
-            response = requests.post(
+            response = await http_client.post(
                 f"{TOOLSERVER_URL}/v1/smarthome/get_status",
                 json={"entity_id": entity_id},
-                timeout=10
+                timeout=TOOLSERVER_TIMEOUT
             )
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             if data.get("success"):
                 return {"success": True, "result": data.get("status_text", f"{entity_id}: {data.get('state', 'unknown')}")}
@@ -310,39 +345,101 @@ def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def get_learning_context() -> str:
+# Tools that change state; they run on their own, after every call before them
+MUTATING_TOOLS = frozenset({"set_fact", "smarthome_turn_on", "smarthome_turn_off"})
+
+def tool_call_resource(tool_call: Dict[str, Any]) -> Optional[tuple]:
+    """The fact key or entity a tool call touches, if any"""
+    for arg in ("key", "entity_id"):
+        if arg in tool_call:
+            return (arg, tool_call[arg])
+    return None
+
+async def execute_tool_calls(tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Run the tool calls of one model reply and return their results in the same order.
+    Consecutive read-only calls on different keys/entities run concurrently; calls in one reply
+    often depend on each other, so mutating calls and repeated calls on the same key/entity
+    wait for everything before them.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(tool_calls)
+    group: List[int] = []
+    group_resources = set()
+    
+    async def run_group():
+        group_results = await asyncio.gather(*(execute_tool_call(tool_calls[i]) for i in group))
+        for i, result in zip(group, group_results):
+            results[i] = result
+        group.clear()
+        group_resources.clear()
+    
+    for i, tool_call in enumerate(tool_calls):
+        if tool_call.get("function") in MUTATING_TOOLS:
+            if group:
+                await run_group()
+            results[i] = await execute_tool_call(tool_call)
+            continue
+        
+        resource = tool_call_resource(tool_call)
+        if resource is not None and resource in group_resources:
+            await run_group()
+        group.append(i)
+        if resource is not None:
+            group_resources.add(resource)
+    
+    if group:
+        await run_group()
+    return results
+
+async def get_learning_context() -> str:
     """Get learning context from feedback database"""
+    if _learning_context_cache["value"] is not None and time.monotonic() < _learning_context_cache["expires"]:
+        return _learning_context_cache["value"]
+    
     try:
-        response = requests.get(f"{TOOLSERVER_URL}/v1/learning/context?limit=5", timeout=5)
+        response = await http_client.get(f"{TOOLSERVER_URL}/v1/learning/context?limit=5", timeout=TOOLSERVER_FAST_TIMEOUT)
         if response.status_code == 200:
-            data = response.json()
-            return data.get("context", "")
+            data = orjson.loads(response.content)
+            context = data.get("context", "")
+            _learning_context_cache["value"] = context
+            _learning_context_cache["expires"] = time.monotonic() + CACHE_TTL_SECONDS
+            return context
     except Exception as e:
         print(f"Error fetching learning context: {e}")
     return ""
 
-def process_query(
-    query: str,
-    conversation_history: Optional[List[Dict[str, str]]] = None
-) -> Dict[str, Any]:
-    system_prompt, persona_prompt = load_prompts()
-    tools = get_available_tools()
-    
+def build_static_system_prompt(system_prompt: str, persona_prompt: str, tools: List[Dict[str, Any]]) -> str:
+    """
+    Build the system prompt prefix that stays identical across requests.
+    Tools are sorted by name so the text does not change with the toolserver's ordering.
+    """
     tools_description = "\n".join([
         f"- {tool['name']}: {tool['description']}"
-        for tool in tools
+        for tool in sorted(tools, key=lambda tool: tool["name"])
     ])
     
-    # Get learning context from feedback
-    learning_context = get_learning_context()
+    return f"{system_prompt}\n\n{persona_prompt}\n\nVerfügbare Tools:\n{tools_description}"
+
+async def process_query(
+    query: str,
+    conversation_history: Optional[List[Dict[str, str]]] = None
+) -> Dict[str, Any]:
+    # Prompts, tools and learning context are independent, so fetch them concurrently
+    (system_prompt, persona_prompt), tools, learning_context = await asyncio.gather(
+        asyncio.to_thread(load_prompts),
+        get_available_tools(),
+        get_learning_context()
+    )
     
-    # Build full system prompt with learning context
-    full_system_prompt = f"{system_prompt}\n\n{persona_prompt}\n\nVerfügbare Tools:\n{tools_description}"
+    messages = [{"role": "system", "content": build_static_system_prompt(system_prompt, persona_prompt, tools)}]
     
+    # Learning context changes often, so it goes into its own message after the
+    # static prefix instead of invalidating the provider's prompt cache
     if learning_context:
-        full_system_prompt += f"\n\n{learning_context}\n\nBitte berücksichtige diese früheren Korrekturen und Feedback bei deiner Antwort."
-    
-    messages = [{"role": "system", "content": full_system_prompt}]
+        messages.append({
+            "role": "system",
+            "content": f"{learning_context}\n\nBitte berücksichtige diese früheren Korrekturen und Feedback bei deiner Antwort."
+        })
     
     if conversation_history:
         messages.extend(conversation_history)
@@ -350,18 +447,17 @@ def process_query(
     messages.append({"role": "user", "content": query})
     
     # Call LLM (with new gateway or legacy)
-    llm_response, llm_metadata = call_llm(messages)
+    llm_response, llm_metadata = await call_llm(messages)
     
     tool_calls = parse_tool_calls(llm_response)
     
     tool_results = []
     if tool_calls:
-        for tool_call in tool_calls:
-            result = execute_tool_call(tool_call)
-            tool_results.append({
-                "tool_call": tool_call,
-                "result": result
-            })
+        results = await execute_tool_calls(tool_calls)
+        tool_results = [
+            {"tool_call": tool_call, "result": result}
+            for tool_call, result in zip(tool_calls, results)
+        ]
         
         tool_results_text = "\n".join([
             f"Tool: {tr['tool_call']['function']} -> {tr['result']}"
@@ -374,7 +470,7 @@ def process_query(
             "content": f"Tool-Ergebnisse:\n{tool_results_text}\n\nBitte formuliere jetzt eine finale Antwort für den Benutzer basierend auf diesen Ergebnissen."
         })
         
-        final_response, final_metadata = call_llm(messages)
+        final_response, final_metadata = await call_llm(messages)
         
         return {
             "response": final_response,
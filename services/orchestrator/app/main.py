@@ -2,9 +2,15 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+from contextlib import asynccontextmanager
 import logic
 
-app = FastAPI(title="Jarvis Orchestrator", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await logic.http_client.aclose()
+
+app = FastAPI(title="Jarvis Orchestrator", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,7 +40,7 @@ def health_check():
 @app.post("/v1/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest):
     try:
-        result = logic.process_query(
+        result = await logic.process_query(
             query=request.query,
             conversation_history=request.conversation_history
         )
@@ -1,10 +1,15 @@
-import requests
+import httpx
+import orjson
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set
 
 logger = logging.getLogger(__name__)
 
-RELEVANT_DOMAINS = ["light", "switch", "sensor", "media_player", "climate", "cover", "fan", "binary_sensor"]
+# State reads are fast local calls, service calls may take longer
+HA_READ_TIMEOUT = httpx.Timeout(5.0, connect=2.0)
+HA_SERVICE_TIMEOUT = httpx.Timeout(10.0, connect=2.0)
+
+RELEVANT_DOMAINS = frozenset(["light", "switch", "sensor", "media_player", "climate", "cover", "fan", "binary_sensor"])
 
 
 class HomeAssistantClient:
@@ -13,40 +18,47 @@ class HomeAssistantClient:
     def __init__(self, base_url: str, token: str):
         self.base_url = base_url.rstrip("/")
         self.token = token
-        self.headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
+        
+        # Reuse pooled keep-alive connections; auth headers are set once here
+        self._client = httpx.AsyncClient(
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json"
+            },
+            timeout=HA_READ_TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50)
+        )
+        
+        # Latest known state per entity_id, kept current by WebSocket state_changed events
+        self._states: Dict[str, Dict[str, Any]] = {}
     
-    def _make_request(
+    async def _make_request(
         self,
         method: str,
         endpoint: str,
         data: Optional[Dict[str, Any]] = None,
-        timeout: int = 10
+        timeout: httpx.Timeout = HA_READ_TIMEOUT
     ) -> Optional[Any]:
         """Make a request to Home Assistant API"""
         url = f"{self.base_url}/api{endpoint}"
         
         try:
-            if method.upper() == "GET":
-                response = requests.get(url, headers=self.headers, timeout=timeout)
-            elif method.upper() == "POST":
-                response = requests.post(url, headers=self.headers, json=data, timeout=timeout)
-            else:
+            method = method.upper()
+            if method not in ("GET", "POST"):
                 logger.error(f"Unsupported HTTP method: {method}")
                 return None
             
+            response = await self._client.request(method, url, json=data, timeout=timeout)
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
         
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             logger.error(f"Request to {url} timed out")
             raise Exception("Home Assistant request timed out")
-        except requests.exceptions.ConnectionError:
+        except httpx.TransportError:
             logger.error(f"Cannot connect to Home Assistant at {self.base_url}")
             raise Exception("Cannot connect to Home Assistant")
-        except requests.exceptions.HTTPError as e:
+        except httpx.HTTPStatusError as e:
             if e.response.status_code == 401:
                 logger.error("Invalid Home Assistant token")
                 raise Exception("Invalid Home Assistant token")
@@ -60,50 +72,80 @@ class HomeAssistantClient:
             logger.error(f"Unexpected error: {e}")
             raise
     
-    def check_connection(self) -> bool:
+    async def check_connection(self) -> bool:
         """Check if we can connect to Home Assistant"""
         try:
-            result = self._make_request("GET", "/")
+            result = await self._make_request("GET", "/")
             return result is not None and "message" in result
         except Exception:
             return False
     
-    def get_entities(self, domain: Optional[str] = None) -> List[Dict[str, Any]]:
+    async def get_entities(
+        self,
+        domain: Optional[str] = None,
+        fields: Optional[Set[str]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Get all entities from Home Assistant.
-        Optionally filter by domain.
+        Optionally filter by domain and project each entity to the given fields.
         """
         try:
-            states = self._make_request("GET", "/states")
+            states = await self._make_request("GET", "/states")
             if not states:
                 return []
             
-            filtered_entities = []
             for entity in states:
-                entity_id = entity.get("entity_id", "")
-                entity_domain = entity_id.split(".")[0] if "." in entity_id else ""
-                
-                if domain:
-                    if entity_domain == domain:
-                        filtered_entities.append(entity)
-                elif entity_domain in RELEVANT_DOMAINS:
-                    filtered_entities.append(entity)
+                self._states[entity["entity_id"]] = entity
+            
+            domains = {domain} if domain else RELEVANT_DOMAINS
+            entities = [
+                entity for entity in states
+                if entity.get("entity_id", "").partition(".")[0] in domains
+            ]
+            
+            if fields:
+                entities = [
+                    {key: entity[key] for key in fields if key in entity}
+                    for entity in entities
+                ]
             
-            return filtered_entities
+            return entities
         
         except Exception as e:
             logger.error(f"Error fetching entities: {e}")
             raise
     
-    def get_entity(self, entity_id: str) -> Optional[Dict[str, Any]]:
-        """Get the state of a specific entity"""
+    async def get_entity(self, entity_id: str, use_cache: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Get the state of a specific entity.
+        With use_cache, a state already known from earlier fetches or WebSocket
+        events is returned without a request; only enable this while live
+        updates are being received.
+        """
+        if use_cache:
+            cached = self._states.get(entity_id)
+            if cached is not None:
+                return cached
+        
         try:
-            return self._make_request("GET", f"/states/{entity_id}")
+            entity = await self._make_request("GET", f"/states/{entity_id}")
         except Exception as e:
             logger.error(f"Error fetching entity {entity_id}: {e}")
             raise
+        
+        if entity:
+            # Do not overwrite a newer state that arrived via WebSocket meanwhile
+            self._states.setdefault(entity_id, entity)
+        return entity
+    
+    def update_state(self, entity_id: str, state: Optional[Dict[str, Any]]):
+        """Apply a state change event to the cached states"""
+        if state is None:
+            self._states.pop(entity_id, None)
+        else:
+            self._states[entity_id] = state
     
-    def call_service(
+    async def call_service(
         self,
         domain: str,
         service: str,
@@ -121,20 +163,25 @@ class HomeAssistantClient:
             True if successful, False otherwise
         """
         try:
-            result = self._make_request(
+            result = await self._make_request(
                 "POST",
                 f"/services/{domain}/{service}",
-                data=data
+                data=data,
+                timeout=HA_SERVICE_TIMEOUT
             )
             return result is not None
         except Exception as e:
             logger.error(f"Error calling service {domain}.{service}: {e}")
             raise
     
-    def get_config(self) -> Optional[Dict[str, Any]]:
+    async def get_config(self) -> Optional[Dict[str, Any]]:
         """Get Home Assistant configuration"""
         try:
-            return self._make_request("GET", "/config")
+            return await self._make_request("GET", "/config")
         except Exception as e:
             logger.error(f"Error fetching config: {e}")
             return None
+    
+    async def aclose(self):
+        """Close the underlying HTTP client"""
+        await self._client.aclose()
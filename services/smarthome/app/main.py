@@ -1,9 +1,14 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
+from cachetools import TTLCache
 import os
+import asyncio
 import logging
+import orjson
+import redis.asyncio as redis
 
 from home_assistant import HomeAssistantClient
 from websocket_handler import WebSocketHandler
@@ -11,7 +16,11 @@ from websocket_handler import WebSocketHandler
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Jarvis Smart Home Service", version="1.0.0")
+app = FastAPI(
+    title="Jarvis Smart Home Service",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,6 +37,32 @@ ha_client = HomeAssistantClient(HOME_ASSISTANT_URL, HOME_ASSISTANT_TOKEN)
 ws_handler: Optional[WebSocketHandler] = None
 
 
+def require_token():
+    """Reject Home Assistant calls while no token is configured"""
+    raise HTTPException(status_code=503, detail="HOME_ASSISTANT_TOKEN not configured")
+
+
+# The token is fixed at startup, so the check is only attached when it would fail
+TOKEN_DEPENDENCIES = [] if HOME_ASSISTANT_TOKEN else [Depends(require_token)]
+
+# Short-lived cache of serialized entity responses, invalidated by state changes
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "2.0"))
+ALL_ENTITIES_KEY = "__all__"
+_entities_cache: TTLCache = TTLCache(maxsize=64, ttl=ENTITY_CACHE_TTL)
+_entity_cache: TTLCache = TTLCache(maxsize=1024, ttl=ENTITY_CACHE_TTL)
+
+# Optional Redis tier shared by all replicas; entity lists are stored under
+# REDIS_KEY_PREFIX + domain and evictions are broadcast on REDIS_INVALIDATE_CHANNEL
+REDIS_URL = os.getenv("REDIS_URL", "")
+REDIS_KEY_PREFIX = "jarvis:ha:entities:"
+REDIS_INVALIDATE_CHANNEL = "jarvis:invalidate"
+redis_client: Optional[redis.Redis] = None
+_invalidation_listener: Optional[asyncio.Task] = None
+
+# Entity list fetches currently in flight, so concurrent cache misses share one HA round-trip
+_inflight_entities: Dict[str, "asyncio.Task[bytes]"] = {}
+
+
 class EntityActionRequest(BaseModel):
     entity_id: str
 
@@ -37,6 +72,8 @@ class ServiceCallRequest(BaseModel):
     data: Optional[Dict[str, Any]] = None
 
 
+# Response models are only used to document the schema in OpenAPI (via responses=).
+# Handlers return ORJSONResponse directly, so no validation or jsonable_encoder pass runs.
 class EntityResponse(BaseModel):
     entity_id: str
     state: str
@@ -52,11 +89,128 @@ class ActionResponse(BaseModel):
     entity_id: Optional[str] = None
 
 
+def entity_to_dict(entity: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the EntityResponse shape directly from Home Assistant state JSON"""
+    attributes = entity.get("attributes")
+    return {
+        "entity_id": entity["entity_id"],
+        "state": entity["state"],
+        "friendly_name": attributes.get("friendly_name") if attributes else None,
+        "attributes": attributes,
+        "last_changed": entity.get("last_changed"),
+        "last_updated": entity.get("last_updated")
+    }
+
+
+def serialize_entities(entities: List[Dict[str, Any]]) -> bytes:
+    """Serialize entities one by one into a JSON array without building the converted list"""
+    return b"[" + b",".join(orjson.dumps(entity_to_dict(e)) for e in entities) + b"]"
+
+
+def invalidate_entity_cache(entity_id: str):
+    """Drop cached responses that may contain the given entity"""
+    _entity_cache.pop(entity_id, None)
+    _entities_cache.pop(entity_id.partition(".")[0], None)
+    _entities_cache.pop(ALL_ENTITIES_KEY, None)
+
+
+async def fetch_entities(cache_key: str, domain: Optional[str]) -> bytes:
+    """Fetch and serialize the entity list, storing it in the TTL cache"""
+    body = await get_shared_entities(cache_key)
+    if body is None:
+        entities = await ha_client.get_entities(domain=domain)
+        body = serialize_entities(entities)
+        await set_shared_entities(cache_key, body)
+    
+    _entities_cache[cache_key] = body
+    return body
+
+
+async def get_shared_entities(cache_key: str) -> Optional[bytes]:
+    """Look up a serialized entity list in Redis, if configured"""
+    if redis_client is None:
+        return None
+    try:
+        return await redis_client.get(REDIS_KEY_PREFIX + cache_key)
+    except Exception as e:
+        logger.warning(f"Redis lookup failed: {e}")
+        return None
+
+
+async def set_shared_entities(cache_key: str, body: bytes):
+    """Store a serialized entity list in Redis, if configured"""
+    if redis_client is None:
+        return
+    try:
+        await redis_client.set(REDIS_KEY_PREFIX + cache_key, body, px=int(ENTITY_CACHE_TTL * 1000))
+    except Exception as e:
+        logger.warning(f"Redis store failed: {e}")
+
+
+async def invalidate_shared_cache(entity_id: str):
+    """Evict the entity locally, from Redis, and on all other replicas"""
+    invalidate_entity_cache(entity_id)
+    if redis_client is None:
+        return
+    try:
+        await redis_client.delete(
+            REDIS_KEY_PREFIX + entity_id.partition(".")[0],
+            REDIS_KEY_PREFIX + ALL_ENTITIES_KEY
+        )
+        await redis_client.publish(REDIS_INVALIDATE_CHANNEL, entity_id)
+    except Exception as e:
+        logger.warning(f"Redis invalidation failed: {e}")
+
+
+async def listen_for_invalidations():
+    """Evict local cache entries for entities changed on other replicas"""
+    try:
+        async with redis_client.pubsub() as pubsub:
+            await pubsub.subscribe(REDIS_INVALIDATE_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    invalidate_entity_cache(message["data"].decode())
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Redis invalidation listener stopped: {e}")
+
+
+async def handle_state_changed(event: dict):
+    """Keep the client's entity states current from WebSocket events"""
+    ha_client.update_state(event["entity_id"], event["state"])
+    await invalidate_shared_cache(event["entity_id"])
+
+
+async def resync_states():
+    """Reload all states once the WebSocket subscription is live"""
+    await ha_client.get_entities(fields={"entity_id"})
+
+
+def live_states_available(entity_id: str) -> bool:
+    """Cached entity states are only trusted while a confirmed subscription delivers the entity's changes"""
+    return ws_handler is not None and ws_handler.tracks(entity_id)
+
+
 @app.on_event("startup")
 async def startup_event():
-    global ws_handler
+    global ws_handler, redis_client, _invalidation_listener
+    if REDIS_URL:
+        redis_client = redis.Redis.from_url(REDIS_URL)
+        _invalidation_listener = asyncio.create_task(listen_for_invalidations())
+        logger.info("Redis entity cache enabled")
+    
     if HOME_ASSISTANT_TOKEN:
         ws_handler = WebSocketHandler(HOME_ASSISTANT_URL, HOME_ASSISTANT_TOKEN)
+        ws_handler.set_event_callback(handle_state_changed)
+        ws_handler.set_subscribed_callback(resync_states)
+        try:
+            # Subscribe only to the entities this service exposes; falls back to all state changes
+            entities = await ha_client.get_entities(fields={"entity_id"})
+            ws_handler.set_entity_filter(entity["entity_id"] for entity in entities)
+        except Exception as e:
+            logger.warning(f"Could not load entity list for WebSocket filter: {e}")
+        
         try:
             await ws_handler.connect()
             logger.info("WebSocket connection to Home Assistant established")
@@ -72,6 +226,16 @@ async def shutdown_event():
     if ws_handler:
         await ws_handler.disconnect()
         logger.info("WebSocket connection closed")
+    
+    if redis_client is not None:
+        _invalidation_listener.cancel()
+        try:
+            await _invalidation_listener
+        except asyncio.CancelledError:
+            pass
+        await redis_client.aclose()
+    
+    await ha_client.aclose()
 
 
 @app.get("/")
@@ -79,16 +243,10 @@ def root():
     return {"service": "Jarvis Smart Home Service", "status": "running"}
 
 
-@app.get("/health")
-def health_check():
+@app.get("/health", dependencies=TOKEN_DEPENDENCIES)
+async def health_check():
     """Check connection to Home Assistant"""
-    if not HOME_ASSISTANT_TOKEN:
-        raise HTTPException(
-            status_code=503,
-            detail="HOME_ASSISTANT_TOKEN not configured"
-        )
-    
-    is_connected = ha_client.check_connection()
+    is_connected = await ha_client.check_connection()
     if is_connected:
         return {"status": "healthy", "home_assistant": "connected"}
     else:
@@ -98,54 +256,49 @@ def health_check():
         )
 
 
-@app.get("/v1/entities", response_model=List[EntityResponse])
-def get_entities(
+@app.get("/v1/entities", responses={200: {"model": List[EntityResponse]}}, dependencies=TOKEN_DEPENDENCIES)
+async def get_entities(
     domain: Optional[str] = Query(None, description="Filter by domain (e.g., 'light', 'switch', 'sensor')")
 ):
     """
     Get all entities from Home Assistant.
     Filters to relevant domains: light, switch, sensor, media_player, climate, cover, fan
     """
-    if not HOME_ASSISTANT_TOKEN:
-        raise HTTPException(status_code=503, detail="HOME_ASSISTANT_TOKEN not configured")
+    cache_key = domain or ALL_ENTITIES_KEY
+    body = _entities_cache.get(cache_key)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+    
+    task = _inflight_entities.get(cache_key)
+    if task is None:
+        task = asyncio.create_task(fetch_entities(cache_key, domain))
+        _inflight_entities[cache_key] = task
+        task.add_done_callback(lambda _: _inflight_entities.pop(cache_key, None))
     
     try:
-        entities = ha_client.get_entities(domain=domain)
-        return [
-            EntityResponse(
-                entity_id=e["entity_id"],
-                state=e["state"],
-                friendly_name=e.get("attributes", {}).get("friendly_name"),
-                attributes=e.get("attributes"),
-                last_changed=e.get("last_changed"),
-                last_updated=e.get("last_updated")
-            )
-            for e in entities
-        ]
+        # Shield so a disconnecting client does not cancel the fetch for the other waiters
+        body = await asyncio.shield(task)
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         logger.error(f"Error fetching entities: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/v1/entities/{entity_id}", response_model=EntityResponse)
-def get_entity(entity_id: str):
+@app.get("/v1/entities/{entity_id}", responses={200: {"model": EntityResponse}}, dependencies=TOKEN_DEPENDENCIES)
+async def get_entity(entity_id: str):
     """Get the state of a specific entity"""
-    if not HOME_ASSISTANT_TOKEN:
-        raise HTTPException(status_code=503, detail="HOME_ASSISTANT_TOKEN not configured")
+    body = _entity_cache.get(entity_id)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
     
     try:
-        entity = ha_client.get_entity(entity_id)
+        entity = await ha_client.get_entity(entity_id, use_cache=live_states_available(entity_id))
         if not entity:
             raise HTTPException(status_code=404, detail=f"Entity '{entity_id}' not found")
         
-        return EntityResponse(
-            entity_id=entity["entity_id"],
-            state=entity["state"],
-            friendly_name=entity.get("attributes", {}).get("friendly_name"),
-            attributes=entity.get("attributes"),
-            last_changed=entity.get("last_changed"),
-            last_updated=entity.get("last_updated")
-        )
+        body = orjson.dumps(entity_to_dict(entity))
+        _entity_cache[entity_id] = body
+        return Response(content=body, media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
@@ -153,28 +306,26 @@ def get_entity(entity_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/v1/services/{domain}/{service}", response_model=ActionResponse)
-def call_service(domain: str, service: str, request: ServiceCallRequest):
+@app.post("/v1/services/{domain}/{service}", responses={200: {"model": ActionResponse}}, dependencies=TOKEN_DEPENDENCIES)
+async def call_service(domain: str, service: str, request: ServiceCallRequest):
     """
     Call a Home Assistant service.
     Example: POST /v1/services/light/turn_on with {"entity_id": "light.wohnzimmer"}
     """
-    if not HOME_ASSISTANT_TOKEN:
-        raise HTTPException(status_code=503, detail="HOME_ASSISTANT_TOKEN not configured")
-    
     try:
         service_data = {"entity_id": request.entity_id}
         if request.data:
             service_data.update(request.data)
         
-        success = ha_client.call_service(domain, service, service_data)
+        success = await ha_client.call_service(domain, service, service_data)
+        await invalidate_shared_cache(request.entity_id)
         
         if success:
-            return ActionResponse(
-                success=True,
-                message=f"Service {domain}.{service} called successfully",
-                entity_id=request.entity_id
-            )
+            return ORJSONResponse({
+                "success": True,
+                "message": f"Service {domain}.{service} called successfully",
+                "entity_id": request.entity_id
+            })
         else:
             raise HTTPException(
                 status_code=500,
@@ -187,85 +338,36 @@ def call_service(domain: str, service: str, request: ServiceCallRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/v1/actions/turn_on", response_model=ActionResponse)
-def turn_on(request: EntityActionRequest):
-    """Turn on a device (light, switch, etc.)"""
-    if not HOME_ASSISTANT_TOKEN:
-        raise HTTPException(status_code=503, detail="HOME_ASSISTANT_TOKEN not configured")
-    
-    try:
-        domain = request.entity_id.split(".")[0]
-        success = ha_client.call_service(domain, "turn_on", {"entity_id": request.entity_id})
-        
-        if success:
-            return ActionResponse(
-                success=True,
-                message=f"Turned on {request.entity_id}",
-                entity_id=request.entity_id
-            )
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to turn on {request.entity_id}"
-            )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error turning on {request.entity_id}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@app.post("/v1/actions/turn_off", response_model=ActionResponse)
-def turn_off(request: EntityActionRequest):
-    """Turn off a device (light, switch, etc.)"""
-    if not HOME_ASSISTANT_TOKEN:
-        raise HTTPException(status_code=503, detail="HOME_ASSISTANT_TOKEN not configured")
-    
-    try:
-        domain = request.entity_id.split(".")[0]
-        success = ha_client.call_service(domain, "turn_off", {"entity_id": request.entity_id})
-        
-        if success:
-            return ActionResponse(
-                success=True,
-                message=f"Turned off {request.entity_id}",
-                entity_id=request.entity_id
-            )
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to turn off {request.entity_id}"
-            )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error turning off {request.entity_id}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+# Per action: success message, and the phrases used in failure detail and log
+ACTION_MESSAGES = {
+    "turn_on": ("Turned on", "turn on", "turning on"),
+    "turn_off": ("Turned off", "turn off", "turning off"),
+    "toggle": ("Toggled", "toggle", "toggling"),
+}
 
 
-@app.post("/v1/actions/toggle", response_model=ActionResponse)
-def toggle(request: EntityActionRequest):
-    """Toggle a device (light, switch, etc.)"""
-    if not HOME_ASSISTANT_TOKEN:
-        raise HTTPException(status_code=503, detail="HOME_ASSISTANT_TOKEN not configured")
-    
+@app.post("/v1/actions/{action}", responses={200: {"model": ActionResponse}}, dependencies=TOKEN_DEPENDENCIES)
+async def entity_action(action: Literal["turn_on", "turn_off", "toggle"], request: EntityActionRequest):
+    """Turn on, turn off or toggle a device (light, switch, etc.)"""
+    done, verb, gerund = ACTION_MESSAGES[action]
     try:
-        domain = request.entity_id.split(".")[0]
-        success = ha_client.call_service(domain, "toggle", {"entity_id": request.entity_id})
+        domain = request.entity_id.partition(".")[0]
+        success = await ha_client.call_service(domain, action, {"entity_id": request.entity_id})
+        await invalidate_shared_cache(request.entity_id)
         
         if success:
-            return ActionResponse(
-                success=True,
-                message=f"Toggled {request.entity_id}",
-                entity_id=request.entity_id
-            )
+            return ORJSONResponse({
+                "success": True,
+                "message": f"{done} {request.entity_id}",
+                "entity_id": request.entity_id
+            })
         else:
             raise HTTPException(
                 status_code=500,
-                detail=f"Failed to toggle {request.entity_id}"
+                detail=f"Failed to {verb} {request.entity_id}"
             )
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error toggling {request.entity_id}: {e}")
+        logger.error(f"Error {gerund} {request.entity_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
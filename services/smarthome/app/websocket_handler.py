@@ -1,7 +1,7 @@
 import asyncio
-import json
+import orjson
 import logging
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, Iterable
 import websockets
 from websockets.exceptions import ConnectionClosed
 
@@ -24,7 +24,13 @@ class WebSocketHandler:
         self.websocket: Optional[websockets.WebSocketClientProtocol] = None
         self.message_id = 0
         self.running = False
+        # Only set once Home Assistant confirmed the state change subscription
+        self.subscribed = False
+        self._subscribe_id: Optional[int] = None
+        self._subscribe_type: Optional[str] = None
         self.event_callback: Optional[Callable[[dict], Any]] = None
+        self.subscribed_callback: Optional[Callable[[], Any]] = None
+        self.entity_ids: Optional[frozenset] = None
         self._listen_task: Optional[asyncio.Task] = None
     
     def _get_next_id(self) -> int:
@@ -38,22 +44,30 @@ class WebSocketHandler:
         Returns True if connection and authentication successful.
         """
         try:
-            self.websocket = await websockets.connect(self.ws_url)
+            # Event frames are small JSON text, so per-message deflate only costs CPU here
+            self.websocket = await websockets.connect(
+                self.ws_url,
+                max_size=2**20,
+                compression=None,
+                ping_interval=20,
+                ping_timeout=20
+            )
             
             auth_required = await self.websocket.recv()
-            auth_msg = json.loads(auth_required)
+            auth_msg = orjson.loads(auth_required)
             
             if auth_msg.get("type") != "auth_required":
                 logger.error(f"Unexpected message type: {auth_msg.get('type')}")
                 return False
             
-            await self.websocket.send(json.dumps({
+            # Home Assistant only accepts text frames, so encoded bytes are decoded before sending
+            await self.websocket.send(orjson.dumps({
                 "type": "auth",
                 "access_token": self.token
-            }))
+            }).decode())
             
             auth_result = await self.websocket.recv()
-            auth_result_msg = json.loads(auth_result)
+            auth_result_msg = orjson.loads(auth_result)
             
             if auth_result_msg.get("type") == "auth_ok":
                 logger.info("WebSocket authentication successful")
@@ -77,33 +91,63 @@ class WebSocketHandler:
             return
         
         try:
-            subscribe_msg = {
-                "id": self._get_next_id(),
-                "type": "subscribe_events",
-                "event_type": "state_changed"
-            }
-            await self.websocket.send(json.dumps(subscribe_msg))
+            if self.entity_ids:
+                # Let Home Assistant filter: only changes of the tracked entities are sent
+                await self._subscribe({
+                    "type": "subscribe_trigger",
+                    "trigger": {"platform": "state", "entity_id": sorted(self.entity_ids)}
+                })
+            else:
+                await self._subscribe_state_changed()
             
-            while self.running:
-                try:
-                    message = await asyncio.wait_for(
-                        self.websocket.recv(),
-                        timeout=30.0
-                    )
-                    data = json.loads(message)
-                    await self._handle_message(data)
-                
-                except asyncio.TimeoutError:
-                    continue
-                except ConnectionClosed:
-                    logger.warning("WebSocket connection closed")
+            # Liveness is enforced by the keepalive pings configured in connect()
+            async for message in self.websocket:
+                if not self.running:
                     break
+                await self._handle_message(orjson.loads(message))
         
+        except ConnectionClosed:
+            logger.warning("WebSocket connection closed")
         except Exception as e:
             logger.error(f"Error in WebSocket listener: {e}")
         
         finally:
             self.running = False
+            self.subscribed = False
+    
+    async def _subscribe(self, message: dict):
+        """Send a subscribe command and remember its id to match the result"""
+        self._subscribe_id = self._get_next_id()
+        self._subscribe_type = message["type"]
+        await self.websocket.send(orjson.dumps({"id": self._subscribe_id, **message}).decode())
+    
+    async def _subscribe_state_changed(self):
+        """Subscribe to all state_changed events"""
+        await self._subscribe({"type": "subscribe_events", "event_type": "state_changed"})
+    
+    async def _handle_subscribe_result(self, data: dict):
+        """Mark the subscription as live once Home Assistant acknowledged it"""
+        if not data.get("success", False):
+            error = data.get("error", {})
+            if self._subscribe_type == "subscribe_trigger":
+                # e.g. non-admin token or rejected trigger config; entity filtering then happens locally
+                logger.warning("Trigger subscription failed, falling back to state_changed events: %s", error)
+                await self._subscribe_state_changed()
+            else:
+                logger.warning("State change subscription failed, cached states stay disabled: %s", error)
+            return
+        
+        # Resync before trusting the cache: changes between the startup fetch and now were missed.
+        # Events received meanwhile wait in the socket and are applied afterwards
+        if self.subscribed_callback:
+            try:
+                await self.subscribed_callback()
+            except Exception as e:
+                logger.error(f"Error in subscribed callback, cached states stay disabled: {e}")
+                return
+        
+        self.subscribed = True
+        logger.info("State change subscription confirmed")
     
     async def _handle_message(self, data: dict):
         """Handle incoming WebSocket messages"""
@@ -111,33 +155,51 @@ class WebSocketHandler:
         
         if msg_type == "event":
             event = data.get("event", {})
-            event_type = event.get("event_type")
             
-            if event_type == "state_changed":
+            # subscribe_trigger wraps the change in trigger variables, subscribe_events in event data
+            if "variables" in event:
+                event_data = event["variables"].get("trigger", {})
+                old_key, new_key = "from_state", "to_state"
+            elif event.get("event_type") == "state_changed":
                 event_data = event.get("data", {})
-                entity_id = event_data.get("entity_id", "unknown")
-                old_state = event_data.get("old_state", {})
-                new_state = event_data.get("new_state", {})
-                
-                old_state_val = old_state.get("state", "unknown") if old_state else "unknown"
-                new_state_val = new_state.get("state", "unknown") if new_state else "unknown"
-                
-                logger.info(
-                    f"State changed: {entity_id} - {old_state_val} -> {new_state_val}"
-                )
-                
-                if self.event_callback:
-                    try:
-                        await self.event_callback({
-                            "entity_id": entity_id,
-                            "old_state": old_state_val,
-                            "new_state": new_state_val,
-                            "attributes": new_state.get("attributes", {}) if new_state else {}
-                        })
-                    except Exception as e:
-                        logger.error(f"Error in event callback: {e}")
+                old_key, new_key = "old_state", "new_state"
+            else:
+                return
+            
+            log_changes = logger.isEnabledFor(logging.INFO)
+            if self.event_callback is None and not log_changes:
+                return
+            
+            entity_id = event_data.get("entity_id", "unknown")
+            if self.entity_ids and entity_id not in self.entity_ids:
+                return
+            
+            old_state = event_data.get(old_key)
+            new_state = event_data.get(new_key)
+            
+            old_state_val = old_state.get("state", "unknown") if old_state else "unknown"
+            new_state_val = new_state.get("state", "unknown") if new_state else "unknown"
+            
+            if log_changes:
+                logger.info("State changed: %s - %s -> %s", entity_id, old_state_val, new_state_val)
+            
+            if self.event_callback:
+                try:
+                    await self.event_callback({
+                        "entity_id": entity_id,
+                        "old_state": old_state_val,
+                        "new_state": new_state_val,
+                        "attributes": new_state.get("attributes", {}) if new_state else {},
+                        "state": new_state
+                    })
+                except Exception as e:
+                    logger.error(f"Error in event callback: {e}")
         
         elif msg_type == "result":
+            if data.get("id") == self._subscribe_id:
+                await self._handle_subscribe_result(data)
+                return
+            
             success = data.get("success", False)
             if not success:
                 error = data.get("error", {})
@@ -147,9 +209,22 @@ class WebSocketHandler:
         """Set a callback function to be called when state changes occur"""
         self.event_callback = callback
     
+    def set_subscribed_callback(self, callback: Callable[[], Any]):
+        """Set a callback to run after the subscription is confirmed, before states are trusted"""
+        self.subscribed_callback = callback
+    
+    def set_entity_filter(self, entity_ids: Iterable[str]):
+        """Only subscribe to state changes of the given entities (applies on the next connect)"""
+        self.entity_ids = frozenset(entity_ids)
+    
+    def tracks(self, entity_id: str) -> bool:
+        """Whether live state changes of this entity are currently being received"""
+        return self.running and self.subscribed and (not self.entity_ids or entity_id in self.entity_ids)
+    
     async def disconnect(self):
         """Disconnect from WebSocket"""
         self.running = False
+        self.subscribed = False
         
         if self._listen_task:
             self._listen_task.cancel()
@@ -1,46 +1,59 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from models import Base, Fact
 import os
-from typing import Optional, List
+from typing import Optional, List, AsyncIterator
 
 FACTS_DB_PATH = os.getenv("FACTS_DB_PATH", "/app/data/facts.db")
 
-engine = create_engine(f"sqlite:///{FACTS_DB_PATH}", connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def init_db():
-    Base.metadata.create_all(bind=engine)
-
-def get_db():
-    db = SessionLocal()
-    try:
+# aiosqlite defaults to NullPool; keep connections open between requests instead
+engine = create_async_engine(
+    f"sqlite+aiosqlite:///{FACTS_DB_PATH}",
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=20,
+    max_overflow=40
+)
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def set_fact(db: Session, key: str, value: str) -> Fact:
-    fact = db.query(Fact).filter(Fact.key == key).first()
+async def set_fact(db: AsyncSession, key: str, value: str) -> Fact:
+    fact = await db.get(Fact, key)
     if fact:
         fact.value = value
     else:
         fact = Fact(key=key, value=value)
         db.add(fact)
     
-    db.commit()
-    db.refresh(fact)
+    await db.commit()
+    await db.refresh(fact)
     return fact
 
-def get_fact(db: Session, key: str) -> Optional[Fact]:
-    return db.query(Fact).filter(Fact.key == key).first()
+async def get_fact(db: AsyncSession, key: str) -> Optional[Fact]:
+    return await db.get(Fact, key)
+
+async def list_all_facts(db: AsyncSession) -> List[Fact]:
+    result = await db.execute(select(Fact))
+    return list(result.scalars().all())
 
-def list_all_facts(db: Session) -> List[Fact]:
-    return db.query(Fact).all()
+async def iter_all_facts() -> AsyncIterator[Fact]:
+    """Stream all facts in chunks on a session of its own, for use after the handler returned"""
+    async with SessionLocal() as db:
+        result = await db.stream_scalars(select(Fact).execution_options(yield_per=1000))
+        async for fact in result:
+            yield fact
 
-def delete_fact(db: Session, key: str) -> bool:
-    fact = db.query(Fact).filter(Fact.key == key).first()
+async def delete_fact(db: AsyncSession, key: str) -> bool:
+    fact = await db.get(Fact, key)
     if fact:
-        db.delete(fact)
-        db.commit()
+        await db.delete(fact)
+        await db.commit()
         return True
     return False
@@ -3,24 +3,141 @@ Feedback Database Module for Continuous Learning
 Stores user feedback, corrections, and learned patterns
 """
 
-import sqlite3
+import io
+import asyncio
+import aiosqlite
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterable, Tuple, AsyncIterator
 import json
 
 
+# Hot-path statements kept as constants so the connection's statement cache always hits
+_SQL_ADD_FEEDBACK = """
+    INSERT INTO feedback (query, response, rating, comment, model, provider)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+_SQL_ADD_CORRECTION = """
+    INSERT INTO corrections (query, wrong_response, correct_response, context)
+    VALUES (?, ?, ?, ?)
+"""
+
+_SQL_GET_NEGATIVE_FEEDBACK = """
+    SELECT id, query, response, rating, comment, model, provider, timestamp
+    FROM feedback
+    WHERE rating <= 2
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+_SQL_GET_CORRECTIONS = """
+    SELECT id, query, wrong_response, correct_response, context, timestamp
+    FROM corrections
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+_SQL_LEARNING_CONTEXT = """
+    SELECT * FROM (
+        SELECT 'c' AS kind, query, wrong_response AS response, correct_response AS note, timestamp
+        FROM corrections
+        ORDER BY timestamp DESC
+        LIMIT ?
+    )
+    UNION ALL
+    SELECT * FROM (
+        SELECT 'f' AS kind, query, response, comment AS note, timestamp
+        FROM feedback
+        WHERE rating <= 2 AND comment IS NOT NULL
+        ORDER BY timestamp DESC
+        LIMIT ?
+    )
+    ORDER BY kind, timestamp DESC
+"""
+
+_SQL_STATISTICS = """
+    SELECT
+        COUNT(*),
+        AVG(rating),
+        SUM(timestamp >= datetime('now', '-7 days')),
+        (SELECT COUNT(*) FROM corrections)
+    FROM feedback
+"""
+
+_SQL_RATING_DISTRIBUTION = """
+    SELECT rating, COUNT(*) as count
+    FROM feedback
+    GROUP BY rating
+    ORDER BY rating
+"""
+
+_SQL_SET_PREFERENCE = """
+    INSERT INTO user_preferences (preference_key, preference_value)
+    VALUES (?, ?)
+    ON CONFLICT(preference_key) 
+    DO UPDATE SET preference_value = ?, updated_at = CURRENT_TIMESTAMP
+"""
+
+_SQL_GET_PREFERENCE = """
+    SELECT preference_value FROM user_preferences
+    WHERE preference_key = ?
+"""
+
+_SQL_GET_ALL_PREFERENCES = "SELECT preference_key, preference_value FROM user_preferences"
+
+_INDICES = frozenset({
+    "idx_feedback_rating_ts",
+    "idx_feedback_ts",
+    "idx_corrections_ts",
+    "idx_feedback_commented_ts"
+})
+
+
 class FeedbackDB:
     def __init__(self, db_path: str):
         self.db_path = db_path
-        self.init_db()
+        self._conn: Optional[aiosqlite.Connection] = None
+        
+        # Guards connection setup and write transactions on the shared connection;
+        # aiosqlite runs all statements on the connection's own worker thread
+        self._lock = asyncio.Lock()
+    
+    async def _connection(self) -> aiosqlite.Connection:
+        """Open the shared connection on first use"""
+        if self._conn is None:
+            async with self._lock:
+                if self._conn is None:
+                    conn = await aiosqlite.connect(self.db_path, cached_statements=256)
+                    await conn.execute("PRAGMA journal_mode=WAL")
+                    await conn.execute("PRAGMA synchronous=NORMAL")
+                    await conn.execute("PRAGMA temp_store=MEMORY")
+                    await conn.execute("PRAGMA mmap_size=268435456")
+                    await conn.execute("PRAGMA cache_size=-65536")
+                    conn.row_factory = aiosqlite.Row
+                    await self._create_schema(conn)
+                    self._conn = conn
+        return self._conn
     
-    def init_db(self):
+    @asynccontextmanager
+    async def _transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Run writes in one transaction, committed on success and rolled back on error"""
+        conn = await self._connection()
+        async with self._lock:
+            try:
+                yield conn
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+    
+    async def init_db(self):
         """Initialize feedback database with tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        await self._connection()
+    
+    async def _create_schema(self, conn: aiosqlite.Connection):
         # Feedback table for user ratings
-        cursor.execute("""
+        await conn.execute("""
             CREATE TABLE IF NOT EXISTS feedback (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 query TEXT NOT NULL,
@@ -34,7 +151,7 @@ class FeedbackDB:
         """)
         
         # Corrections table for user-provided corrections
-        cursor.execute("""
+        await conn.execute("""
             CREATE TABLE IF NOT EXISTS corrections (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 query TEXT NOT NULL,
@@ -46,7 +163,7 @@ class FeedbackDB:
         """)
         
         # Learned patterns table for extracted knowledge
-        cursor.execute("""
+        await conn.execute("""
             CREATE TABLE IF NOT EXISTS learned_patterns (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 pattern_type TEXT NOT NULL,
@@ -60,7 +177,7 @@ class FeedbackDB:
         """)
         
         # User preferences table
-        cursor.execute("""
+        await conn.execute("""
             CREATE TABLE IF NOT EXISTS user_preferences (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 preference_key TEXT UNIQUE NOT NULL,
@@ -69,10 +186,32 @@ class FeedbackDB:
             )
         """)
         
-        conn.commit()
-        conn.close()
+        # Indices for the rating filters and newest-first ordering used by the read queries
+        async with conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'") as cursor:
+            existing_indices = {row[0] async for row in cursor}
+        
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_rating_ts ON feedback(rating, timestamp DESC)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_ts ON feedback(timestamp DESC)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_corrections_ts ON corrections(timestamp DESC)")
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_feedback_commented_ts
+            ON feedback(timestamp DESC)
+            WHERE rating <= 2 AND comment IS NOT NULL
+        """)
+        
+        # Statistics only need a full ANALYZE when an index is new; otherwise close() runs PRAGMA optimize
+        if not _INDICES <= existing_indices:
+            await conn.execute("ANALYZE")
+        await conn.commit()
     
-    def add_feedback(
+    async def close(self):
+        """Close the shared database connection"""
+        if self._conn is not None:
+            await self._conn.execute("PRAGMA optimize")
+            await self._conn.close()
+            self._conn = None
+    
+    async def add_feedback(
         self, 
         query: str, 
         response: str, 
@@ -95,21 +234,12 @@ class FeedbackDB:
         Returns:
             Feedback ID
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO feedback (query, response, rating, comment, model, provider)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (query, response, rating, comment, model, provider))
+        async with self._transaction() as conn:
+            cursor = await conn.execute(_SQL_ADD_FEEDBACK, (query, response, rating, comment, model, provider))
         
-        feedback_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        return feedback_id
+        return cursor.lastrowid
     
-    def add_correction(
+    async def add_correction(
         self,
         query: str,
         wrong_response: str,
@@ -128,207 +258,137 @@ class FeedbackDB:
         Returns:
             Correction ID
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        async with self._transaction() as conn:
+            cursor = await conn.execute(_SQL_ADD_CORRECTION, (query, wrong_response, correct_response, context))
         
-        cursor.execute("""
-            INSERT INTO corrections (query, wrong_response, correct_response, context)
-            VALUES (?, ?, ?, ?)
-        """, (query, wrong_response, correct_response, context))
+        return cursor.lastrowid
+    
+    async def add_feedback_batch(self, rows: Iterable[Tuple]) -> int:
+        """
+        Add many feedback entries in a single transaction
         
-        correction_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        Args:
+            rows: (query, response, rating, comment, model, provider) tuples
+            
+        Returns:
+            Number of inserted rows
+        """
+        async with self._transaction() as conn:
+            cursor = await conn.executemany(_SQL_ADD_FEEDBACK, rows)
         
-        return correction_id
+        return cursor.rowcount
     
-    def get_negative_feedback(self, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get feedback with low ratings (1-2 stars)"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    async def add_correction_batch(self, rows: Iterable[Tuple]) -> int:
+        """
+        Add many corrections in a single transaction
         
-        cursor.execute("""
-            SELECT id, query, response, rating, comment, model, provider, timestamp
-            FROM feedback
-            WHERE rating <= 2
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (limit,))
+        Args:
+            rows: (query, wrong_response, correct_response, context) tuples
+            
+        Returns:
+            Number of inserted rows
+        """
+        async with self._transaction() as conn:
+            cursor = await conn.executemany(_SQL_ADD_CORRECTION, rows)
         
-        rows = cursor.fetchall()
-        conn.close()
+        return cursor.rowcount
+    
+    async def get_negative_feedback(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get feedback with low ratings (1-2 stars)"""
+        conn = await self._connection()
+        rows = await conn.execute_fetchall(_SQL_GET_NEGATIVE_FEEDBACK, (limit,))
         
-        return [
-            {
-                "id": row[0],
-                "query": row[1],
-                "response": row[2],
-                "rating": row[3],
-                "comment": row[4],
-                "model": row[5],
-                "provider": row[6],
-                "timestamp": row[7]
-            }
-            for row in rows
-        ]
+        return [dict(row) for row in rows]
     
-    def get_corrections(self, limit: int = 50) -> List[Dict[str, Any]]:
+    async def get_corrections(self, limit: int = 50) -> List[Dict[str, Any]]:
         """Get all corrections"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, query, wrong_response, correct_response, context, timestamp
-            FROM corrections
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (limit,))
+        conn = await self._connection()
+        rows = await conn.execute_fetchall(_SQL_GET_CORRECTIONS, (limit,))
         
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [
-            {
-                "id": row[0],
-                "query": row[1],
-                "wrong_response": row[2],
-                "correct_response": row[3],
-                "context": row[4],
-                "timestamp": row[5]
-            }
-            for row in rows
-        ]
+        return [dict(row) for row in rows]
+    
+    async def iter_negative_feedback(self, limit: int = 50) -> AsyncIterator[Dict[str, Any]]:
+        """Stream low-rated feedback row by row"""
+        conn = await self._connection()
+        async with conn.execute(_SQL_GET_NEGATIVE_FEEDBACK, (limit,)) as cursor:
+            async for row in cursor:
+                yield dict(row)
     
-    def get_learning_context(self, query: str, limit: int = 5) -> str:
+    async def iter_corrections(self, limit: int = 50) -> AsyncIterator[Dict[str, Any]]:
+        """Stream corrections row by row"""
+        conn = await self._connection()
+        async with conn.execute(_SQL_GET_CORRECTIONS, (limit,)) as cursor:
+            async for row in cursor:
+                yield dict(row)
+    
+    async def get_learning_context(self, query: str, limit: int = 5) -> str:
         """
         Get relevant learning context for a query
         Includes corrections and negative feedback
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get relevant corrections
-        cursor.execute("""
-            SELECT query, wrong_response, correct_response
-            FROM corrections
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (limit,))
-        
-        corrections = cursor.fetchall()
-        
-        # Get negative feedback with comments
-        cursor.execute("""
-            SELECT query, response, comment
-            FROM feedback
-            WHERE rating <= 2 AND comment IS NOT NULL
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (limit,))
-        
-        negative_feedback = cursor.fetchall()
-        conn.close()
-        
-        # Build context string
-        context_parts = []
-        
-        if corrections:
-            context_parts.append("## Frühere Korrekturen (lerne daraus):")
-            for i, (q, wrong, correct) in enumerate(corrections, 1):
-                context_parts.append(f"\n{i}. Frage: {q}")
-                context_parts.append(f"   Falsche Antwort: {wrong[:100]}...")
-                context_parts.append(f"   Richtige Antwort: {correct[:100]}...")
-        
-        if negative_feedback:
-            context_parts.append("\n## Negatives Feedback (vermeide solche Antworten):")
-            for i, (q, resp, comment) in enumerate(negative_feedback, 1):
-                context_parts.append(f"\n{i}. Frage: {q}")
-                context_parts.append(f"   Problematische Antwort: {resp[:100]}...")
-                if comment:
-                    context_parts.append(f"   Feedback: {comment}")
-        
-        return "\n".join(context_parts) if context_parts else ""
+        # Recent corrections and commented negative feedback in one round-trip
+        conn = await self._connection()
+        rows = await conn.execute_fetchall(_SQL_LEARNING_CONTEXT, (limit, limit))
+        
+        if not rows:
+            return ""
+        
+        # Each part is written with a trailing newline; the last one is dropped on return
+        buf = io.StringIO()
+        correction_no = feedback_no = 0
+        
+        for kind, q, resp, note, _ in rows:
+            if kind == "c":
+                if correction_no == 0:
+                    buf.write("## Frühere Korrekturen (lerne daraus):\n")
+                correction_no += 1
+                buf.write(f"\n{correction_no}. Frage: {q}\n   Falsche Antwort: {resp[:100]}...\n   Richtige Antwort: {note[:100]}...\n")
+            else:
+                if feedback_no == 0:
+                    buf.write("\n## Negatives Feedback (vermeide solche Antworten):\n")
+                feedback_no += 1
+                buf.write(f"\n{feedback_no}. Frage: {q}\n   Problematische Antwort: {resp[:100]}...\n")
+                if note:
+                    buf.write(f"   Feedback: {note}\n")
+        
+        return buf.getvalue()[:-1]
     
-    def get_statistics(self) -> Dict[str, Any]:
+    async def get_statistics(self) -> Dict[str, Any]:
         """Get feedback statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Total feedback count
-        cursor.execute("SELECT COUNT(*) FROM feedback")
-        total_feedback = cursor.fetchone()[0]
+        conn = await self._connection()
         
-        # Average rating
-        cursor.execute("SELECT AVG(rating) FROM feedback")
-        avg_rating = cursor.fetchone()[0] or 0
+        # Counts, average and recent feedback in a single pass over the feedback table
+        async with conn.execute(_SQL_STATISTICS) as cursor:
+            total_feedback, avg_rating, recent_feedback, total_corrections = await cursor.fetchone()
         
         # Rating distribution
-        cursor.execute("""
-            SELECT rating, COUNT(*) as count
-            FROM feedback
-            GROUP BY rating
-            ORDER BY rating
-        """)
-        rating_distribution = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        # Total corrections
-        cursor.execute("SELECT COUNT(*) FROM corrections")
-        total_corrections = cursor.fetchone()[0]
-        
-        # Recent feedback (last 7 days)
-        cursor.execute("""
-            SELECT COUNT(*) FROM feedback
-            WHERE timestamp >= datetime('now', '-7 days')
-        """)
-        recent_feedback = cursor.fetchone()[0]
-        
-        conn.close()
+        rows = await conn.execute_fetchall(_SQL_RATING_DISTRIBUTION)
+        rating_distribution = {row[0]: row[1] for row in rows}
         
         return {
             "total_feedback": total_feedback,
-            "average_rating": round(avg_rating, 2),
+            "average_rating": round(avg_rating or 0, 2),
             "rating_distribution": rating_distribution,
             "total_corrections": total_corrections,
-            "recent_feedback_7d": recent_feedback
+            "recent_feedback_7d": recent_feedback or 0
         }
     
-    def set_preference(self, key: str, value: str):
+    async def set_preference(self, key: str, value: str):
         """Set or update a user preference"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO user_preferences (preference_key, preference_value)
-            VALUES (?, ?)
-            ON CONFLICT(preference_key) 
-            DO UPDATE SET preference_value = ?, updated_at = CURRENT_TIMESTAMP
-        """, (key, value, value))
-        
-        conn.commit()
-        conn.close()
+        async with self._transaction() as conn:
+            await conn.execute(_SQL_SET_PREFERENCE, (key, value, value))
     
-    def get_preference(self, key: str) -> Optional[str]:
+    async def get_preference(self, key: str) -> Optional[str]:
         """Get a user preference"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT preference_value FROM user_preferences
-            WHERE preference_key = ?
-        """, (key,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        conn = await self._connection()
+        async with conn.execute(_SQL_GET_PREFERENCE, (key,)) as cursor:
+            row = await cursor.fetchone()
         
         return row[0] if row else None
     
-    def get_all_preferences(self) -> Dict[str, str]:
+    async def get_all_preferences(self) -> Dict[str, str]:
         """Get all user preferences"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT preference_key, preference_value FROM user_preferences")
-        rows = cursor.fetchall()
-        conn.close()
+        conn = await self._connection()
+        rows = await conn.execute_fetchall(_SQL_GET_ALL_PREFERENCES)
         
-        return {row[0]: row[1] for row in rows}
+        return dict(rows)
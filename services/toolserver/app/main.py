@@ -1,29 +1,116 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
+from contextlib import asynccontextmanager
 import database
 import tools
 import os
+import asyncio
+import orjson
+import hashlib
+import msgspec
 from database import get_db, init_db
 from feedback_db import FeedbackDB
 
-app = FastAPI(title="Jarvis Toolserver", version="1.0.0")
+# Initialize feedback database
+FEEDBACK_DB_PATH = os.getenv("FEEDBACK_DB_PATH", "/app/data/feedback.db")
+feedback_db = FeedbackDB(FEEDBACK_DB_PATH)
+
+# Tool definitions are static, so the /v1/tools body is encoded only once
+TOOLS_RESPONSE = orjson.dumps({"tools": tools.get_tool_definitions()})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    await feedback_db.init_db()
+    document_flusher = asyncio.create_task(tools.document_flush_loop())
+    search_batcher = asyncio.create_task(tools.search_batch_loop())
+    
+    yield
+    
+    for task in (document_flusher, search_batcher):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    
+    # Write out documents still waiting in the buffer
+    try:
+        await tools.flush_documents()
+    except Exception as e:
+        print(f"Error flushing documents on shutdown: {e}")
+    
+    await feedback_db.close()
+    await database.engine.dispose()
+    await tools.http_client.aclose()
+
+app = FastAPI(
+    title="Jarvis Toolserver",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+
+# Comma-separated list of browser origins allowed to call the toolserver (the frontend by default)
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:8080,http://localhost:5173").split(",")
+    if origin.strip()
+]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-init_db()
+# Compress larger JSON bodies such as search results and device lists
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match header already names this ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates or "*" in candidates
+
+
+def cached_json_response(request: Request, body: bytes, etag: str, cache_control: str) -> Response:
+    """Return 304 when the client's copy is current, otherwise the body with its ETag"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+TOOLS_ETAG = make_etag(TOOLS_RESPONSE)
+
+
+def wants_ndjson(request: Request) -> bool:
+    """List routes stream NDJSON when the client asks for it and keep returning a JSON array otherwise"""
+    return "application/x-ndjson" in request.headers.get("accept", "")
+
+
+def ndjson_response(rows: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    async def lines():
+        async for row in rows:
+            yield orjson.dumps(row) + b"\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
-# Initialize feedback database
-FEEDBACK_DB_PATH = os.getenv("FEEDBACK_DB_PATH", "/app/data/feedback.db")
-feedback_db = FeedbackDB(FEEDBACK_DB_PATH)
 
 class FactRequest(BaseModel):
     value: str
@@ -61,57 +148,92 @@ class PreferenceRequest(BaseModel):
     value: str
 
 
-class SmartHomeListDevicesRequest(BaseModel):
+# Smart home bodies are decoded with msgspec; these routes are called on every voice command
+class SmartHomeListDevicesRequest(msgspec.Struct):
     domain: str
 
 
-class SmartHomeEntityRequest(BaseModel):
+class SmartHomeEntityRequest(msgspec.Struct):
     entity_id: str
 
 
+def decode_body(body: bytes, type_):
+    try:
+        return msgspec.json.decode(body, type=type_)
+    except msgspec.ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+
+
+async def decode_list_devices(request: Request) -> SmartHomeListDevicesRequest:
+    return decode_body(await request.body(), SmartHomeListDevicesRequest)
+
+
+async def decode_entity(request: Request) -> SmartHomeEntityRequest:
+    return decode_body(await request.body(), SmartHomeEntityRequest)
+
+
 @app.get("/")
 def root():
     return {"service": "Jarvis Toolserver", "status": "running"}
 
 @app.get("/v1/tools")
-def get_tools():
-    return {"tools": tools.get_tool_definitions()}
+def get_tools(request: Request):
+    return cached_json_response(request, TOOLS_RESPONSE, TOOLS_ETAG, "public, max-age=3600")
 
 @app.get("/v1/facts/{key}", response_model=FactResponse)
-def get_fact(key: str, db: Session = Depends(get_db)):
-    fact = database.get_fact(db, key)
+async def get_fact(key: str, db: AsyncSession = Depends(get_db)):
+    fact = await database.get_fact(db, key)
     if not fact:
         raise HTTPException(status_code=404, detail=f"Fact with key '{key}' not found")
     return fact.to_dict()
 
 @app.put("/v1/facts/{key}", response_model=FactResponse)
-def set_fact(key: str, request: FactRequest, db: Session = Depends(get_db)):
-    fact = database.set_fact(db, key, request.value)
+async def set_fact(key: str, request: FactRequest, db: AsyncSession = Depends(get_db)):
+    fact = await database.set_fact(db, key, request.value)
     return fact.to_dict()
 
 @app.delete("/v1/facts/{key}")
-def delete_fact(key: str, db: Session = Depends(get_db)):
-    success = database.delete_fact(db, key)
+async def delete_fact(key: str, db: AsyncSession = Depends(get_db)):
+    success = await database.delete_fact(db, key)
     if not success:
         raise HTTPException(status_code=404, detail=f"Fact with key '{key}' not found")
     return {"message": f"Fact '{key}' deleted successfully"}
 
 @app.get("/v1/facts", response_model=List[FactResponse])
-def list_facts(db: Session = Depends(get_db)):
-    facts = database.list_all_facts(db)
+async def list_facts(request: Request, db: AsyncSession = Depends(get_db)):
+    if wants_ndjson(request):
+        return ndjson_response(fact.to_dict() async for fact in database.iter_all_facts())
+    facts = await database.list_all_facts(db)
     return [fact.to_dict() for fact in facts]
 
 @app.post("/v1/search")
-def search_documents(request: SearchRequest):
-    results = tools.search_docs(request.query, request.n_results)
+async def search_documents(request: SearchRequest):
+    results = await tools.search_docs(request.query, request.n_results)
     return {"query": request.query, "results": results}
 
-@app.post("/v1/documents")
-def add_document(request: DocumentRequest):
-    success = tools.add_document(request.text, request.metadata)
-    if not success:
-        raise HTTPException(status_code=500, detail="Failed to add document")
-    return {"message": "Document added successfully"}
+@app.get("/v1/search/cache_stats")
+def search_cache_stats():
+    return tools.search_cache_stats()
+
+@app.post("/v1/documents", status_code=202)
+async def add_document(request: DocumentRequest):
+    try:
+        doc_id = tools.queue_document(request.text, request.metadata)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except tools.DocumentBufferFull as e:
+        raise HTTPException(status_code=503, detail=f"Document buffer full, retry later: {e}", headers={"Retry-After": "1"})
+    return {"message": "Document queued", "id": doc_id}
+
+@app.post("/v1/documents/flush")
+async def flush_documents():
+    try:
+        count = await tools.flush_documents()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to add documents: {e}")
+    return {"message": "Documents added successfully", "count": count}
 
 @app.get("/health")
 def health_check():
@@ -120,9 +242,14 @@ def health_check():
 # Feedback & Learning Endpoints
 
 @app.post("/v1/feedback")
-def add_feedback(request: FeedbackRequest):
-    """Add user feedback for a conversation"""
-    feedback_id = feedback_db.add_feedback(
+async def add_feedback(
+    request: FeedbackRequest,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    sync: bool = False
+):
+    """Add user feedback for a conversation; written after the response unless sync=true"""
+    fields = dict(
         query=request.query,
         response=request.response,
         rating=request.rating,
@@ -130,87 +257,128 @@ def add_feedback(request: FeedbackRequest):
         model=request.model,
         provider=request.provider
     )
+    if not sync:
+        background_tasks.add_task(feedback_db.add_feedback, **fields)
+        response.status_code = 202
+        return {"message": "Feedback angenommen"}
+    
+    feedback_id = await feedback_db.add_feedback(**fields)
     return {"message": "Feedback gespeichert", "feedback_id": feedback_id}
 
 @app.post("/v1/corrections")
-def add_correction(request: CorrectionRequest):
-    """Add a user correction"""
-    correction_id = feedback_db.add_correction(
+async def add_correction(
+    request: CorrectionRequest,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    sync: bool = False
+):
+    """Add a user correction; written after the response unless sync=true"""
+    fields = dict(
         query=request.query,
         wrong_response=request.wrong_response,
         correct_response=request.correct_response,
         context=request.context
     )
+    if not sync:
+        background_tasks.add_task(feedback_db.add_correction, **fields)
+        response.status_code = 202
+        return {"message": "Korrektur angenommen"}
+    
+    correction_id = await feedback_db.add_correction(**fields)
     return {"message": "Korrektur gespeichert", "correction_id": correction_id}
 
+@app.post("/v1/feedback/batch")
+async def add_feedback_batch(requests: List[FeedbackRequest]):
+    """Add many feedback entries in one transaction"""
+    count = await feedback_db.add_feedback_batch(
+        (r.query, r.response, r.rating, r.comment, r.model, r.provider)
+        for r in requests
+    )
+    return {"message": "Feedback gespeichert", "count": count}
+
+@app.post("/v1/corrections/batch")
+async def add_correction_batch(requests: List[CorrectionRequest]):
+    """Add many corrections in one transaction"""
+    count = await feedback_db.add_correction_batch(
+        (r.query, r.wrong_response, r.correct_response, r.context)
+        for r in requests
+    )
+    return {"message": "Korrekturen gespeichert", "count": count}
+
 @app.get("/v1/learning/context")
-def get_learning_context(limit: int = 5):
+async def get_learning_context(limit: int = 5):
     """Get learning context from feedback and corrections"""
-    context = feedback_db.get_learning_context("", limit)
+    context = await feedback_db.get_learning_context("", limit)
     return {"context": context}
 
 @app.get("/v1/learning/statistics")
-def get_learning_statistics():
+async def get_learning_statistics():
     """Get feedback statistics"""
-    stats = feedback_db.get_statistics()
+    stats = await feedback_db.get_statistics()
     return stats
 
 @app.get("/v1/feedback/negative")
-def get_negative_feedback(limit: int = 20):
+async def get_negative_feedback(request: Request, limit: int = 20):
     """Get negative feedback for analysis"""
-    feedback = feedback_db.get_negative_feedback(limit)
+    if wants_ndjson(request):
+        return ndjson_response(feedback_db.iter_negative_feedback(limit))
+    feedback = await feedback_db.get_negative_feedback(limit)
     return {"feedback": feedback}
 
 @app.get("/v1/corrections")
-def get_corrections(limit: int = 20):
+async def get_corrections(request: Request, limit: int = 20):
     """Get all corrections"""
-    corrections = feedback_db.get_corrections(limit)
+    if wants_ndjson(request):
+        return ndjson_response(feedback_db.iter_corrections(limit))
+    corrections = await feedback_db.get_corrections(limit)
     return {"corrections": corrections}
 
 @app.post("/v1/preferences")
-def set_preference(request: PreferenceRequest):
+async def set_preference(request: PreferenceRequest):
     """Set a user preference"""
-    feedback_db.set_preference(request.key, request.value)
+    await feedback_db.set_preference(request.key, request.value)
     return {"message": "Präferenz gespeichert"}
 
 @app.get("/v1/preferences/{key}")
-def get_preference(key: str):
+async def get_preference(key: str):
     """Get a user preference"""
-    value = feedback_db.get_preference(key)
+    value = await feedback_db.get_preference(key)
     if value is None:
         raise HTTPException(status_code=404, detail=f"Preference '{key}' not found")
     return {"key": key, "value": value}
 
 @app.get("/v1/preferences")
-def get_all_preferences():
+async def get_all_preferences(request: Request):
     """Get all user preferences"""
-    preferences = feedback_db.get_all_preferences()
-    return {"preferences": preferences}
+    preferences = await feedback_db.get_all_preferences()
+    body = orjson.dumps({"preferences": preferences})
+    # Preferences can change at any time, so clients revalidate on every request
+    return cached_json_response(request, body, make_etag(body), "private, no-cache")
 
 
 @app.post("/v1/smarthome/list_devices")
-def smarthome_list_devices(request: SmartHomeListDevicesRequest):
+async def smarthome_list_devices(request: SmartHomeListDevicesRequest = Depends(decode_list_devices)):
     """List all Smart Home devices of a specific type"""
-    result = tools.smarthome_list_devices(request.domain)
+    result = await tools.smarthome_list_devices(request.domain)
     return result
 
 
 @app.post("/v1/smarthome/turn_on")
-def smarthome_turn_on(request: SmartHomeEntityRequest):
+async def smarthome_turn_on(request: SmartHomeEntityRequest = Depends(decode_entity)):
     """Turn on a Smart Home device"""
-    result = tools.smarthome_turn_on(request.entity_id)
+    result = await tools.smarthome_turn_on(request.entity_id)
     return result
 
 
 @app.post("/v1/smarthome/turn_off")
-def smarthome_turn_off(request: SmartHomeEntityRequest):
+async def smarthome_turn_off(request: SmartHomeEntityRequest = Depends(decode_entity)):
     """Turn off a Smart Home device"""
-    result = tools.smarthome_turn_off(request.entity_id)
+    result = await tools.smarthome_turn_off(request.entity_id)
     return result
 
 
 @app.post("/v1/smarthome/get_status")
-def smarthome_get_status(request: SmartHomeEntityRequest):
+async def smarthome_get_status(request: SmartHomeEntityRequest = Depends(decode_entity)):
     """Get the status of a Smart Home device or sensor"""
-    result = tools.smarthome_get_status(request.entity_id)
+    result = await tools.smarthome_get_status(request.entity_id)
     return result
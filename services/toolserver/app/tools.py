@@ -2,17 +2,89 @@ import chromadb
 from chromadb.config import Settings
 import os
 import time
-import requests
-from typing import List, Dict, Optional, Any
+import uuid
+import asyncio
+import httpx
+from urllib.parse import urlsplit
+from threading import Lock, RLock
+from cachetools import TTLCache
+from typing import List, Dict, Optional, Any, Tuple
 
 CHROMA_HOST = os.getenv("CHROMA_HOST", "http://chroma:8000")
 CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "jarvis_docs")
 SMARTHOME_URL = os.getenv("SMARTHOME_URL", "http://smarthome:8008")
 
+# Smart home service routes, resolved once
+_URL_ENTITIES = f"{SMARTHOME_URL}/v1/entities"
+_URL_TURN_ON = f"{SMARTHOME_URL}/v1/actions/turn_on"
+_URL_TURN_OFF = f"{SMARTHOME_URL}/v1/actions/turn_off"
+
+# CHROMA_HOST is parsed once; a bare "host:port" without scheme is accepted as well
+_CHROMA_URL = urlsplit(CHROMA_HOST if "://" in CHROMA_HOST else f"http://{CHROMA_HOST}")
+_CHROMA_HOSTNAME = _CHROMA_URL.hostname or "chroma"
+_CHROMA_PORT = _CHROMA_URL.port or 8000
+
+# HNSW parameters for Chroma's hnswlib index; only applied when the collection is created
+CHROMA_HNSW_M = int(os.getenv("CHROMA_HNSW_M", "32"))
+CHROMA_HNSW_CONSTRUCTION_EF = int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "200"))
+CHROMA_HNSW_SEARCH_EF = int(os.getenv("CHROMA_HNSW_SEARCH_EF", "64"))
+CHROMA_HNSW_BATCH_SIZE = int(os.getenv("CHROMA_HNSW_BATCH_SIZE", "1000"))
+
+# Chroma client and collection are created once per process and reset after a failed call
+_CLIENT = None
+_COLLECTION = None
+_CHROMA_LOCK = Lock()
+
+# Repeated searches are answered from memory; cleared whenever a document is added
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+_SEARCH_CACHE: TTLCache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+_SEARCH_LOCK = RLock()
+_search_cache_stats = {"hits": 0, "misses": 0}
+# Bumped whenever documents are added; searches started under an older generation are not cached
+_search_generation = 0
+
+# Cache misses are queued and sent to Chroma by search_batch_loop as one query call,
+# after SEARCH_BATCH_WINDOW seconds or once SEARCH_BATCH_SIZE searches are waiting;
+# at most SEARCH_BATCH_CONCURRENCY batches are in flight at once
+SEARCH_BATCH_WINDOW = float(os.getenv("SEARCH_BATCH_WINDOW", "0.01"))
+SEARCH_BATCH_SIZE = int(os.getenv("SEARCH_BATCH_SIZE", "16"))
+SEARCH_BATCH_CONCURRENCY = int(os.getenv("SEARCH_BATCH_CONCURRENCY", "4"))
+_search_slots = asyncio.Semaphore(SEARCH_BATCH_CONCURRENCY)
+_search_queue: asyncio.Queue = asyncio.Queue()
+
+# Upper bound for n_results; large k dominates Chroma query latency
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "100"))
+
+# Added documents are buffered and written to Chroma in batches by document_flush_loop,
+# every DOCUMENT_FLUSH_INTERVAL seconds or as soon as DOCUMENT_BATCH_SIZE are pending.
+# At most DOCUMENT_BUFFER_SIZE documents wait at once; a document that Chroma rejects
+# DOCUMENT_MAX_ATTEMPTS times on its own is dropped
+DOCUMENT_FLUSH_INTERVAL = float(os.getenv("DOCUMENT_FLUSH_INTERVAL", "0.5"))
+DOCUMENT_BATCH_SIZE = int(os.getenv("DOCUMENT_BATCH_SIZE", "100"))
+DOCUMENT_BUFFER_SIZE = int(os.getenv("DOCUMENT_BUFFER_SIZE", "10000"))
+DOCUMENT_MAX_ATTEMPTS = int(os.getenv("DOCUMENT_MAX_ATTEMPTS", "3"))
+_PENDING_DOCUMENTS: List[Tuple[str, Optional[Dict], str]] = []
+_document_attempts: Dict[str, int] = {}
+_FLUSH_LOCK = asyncio.Lock()
+_flush_requested = asyncio.Event()
+
+# Shared async client so calls to the smart home service reuse pooled keep-alive connections;
+# closed by the app's shutdown hook
+http_client = httpx.AsyncClient(
+    headers={"Accept": "application/json"},
+    timeout=10.0,
+    transport=httpx.AsyncHTTPTransport(
+        retries=2,
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    )
+)
+
 def get_chroma_client():
-    host = CHROMA_HOST.replace("http://", "").replace("https://", "").split(":")[0]
-    port_str = CHROMA_HOST.split(":")[-1]
-    port = int(port_str) if port_str.isdigit() else 8000
+    global _CLIENT
+    if _CLIENT is not None:
+        return _CLIENT
     
     max_retries = 5
     retry_delay = 2
@@ -20,14 +92,15 @@ def get_chroma_client():
     for attempt in range(max_retries):
         try:
             client = chromadb.HttpClient(
-                host=host,
-                port=port,
+                host=_CHROMA_HOSTNAME,
+                port=_CHROMA_PORT,
                 settings=Settings(
                     anonymized_telemetry=False,
                     allow_reset=True
                 )
             )
             client.heartbeat()
+            _CLIENT = client
             return client
         except Exception as e:
             if attempt < max_retries - 1:
@@ -39,56 +112,267 @@ def get_chroma_client():
                 raise
 
 def get_or_create_collection():
-    client = get_chroma_client()
-    try:
-        collection = client.get_collection(name=CHROMA_COLLECTION)
-    except Exception as e:
-        print(f"Collection not found, creating new one: {e}")
-        collection = client.create_collection(
-            name=CHROMA_COLLECTION,
-            metadata={"description": "Jarvis document collection"}
-        )
-    return collection
+    global _COLLECTION
+    if _COLLECTION is not None:
+        return _COLLECTION
+    
+    with _CHROMA_LOCK:
+        if _COLLECTION is None:
+            client = get_chroma_client()
+            try:
+                collection = client.get_collection(name=CHROMA_COLLECTION)
+            except Exception as e:
+                print(f"Collection not found, creating new one: {e}")
+                collection = client.create_collection(
+                    name=CHROMA_COLLECTION,
+                    metadata={
+                        "description": "Jarvis document collection",
+                        "hnsw:M": CHROMA_HNSW_M,
+                        "hnsw:construction_ef": CHROMA_HNSW_CONSTRUCTION_EF,
+                        "hnsw:search_ef": CHROMA_HNSW_SEARCH_EF,
+                        "hnsw:batch_size": CHROMA_HNSW_BATCH_SIZE
+                    }
+                )
+            _COLLECTION = collection
+    return _COLLECTION
+
+def reset_chroma_connection():
+    """Drop the cached client and collection so the next call reconnects"""
+    global _CLIENT, _COLLECTION
+    _CLIENT = None
+    _COLLECTION = None
 
-def search_docs(query: str, n_results: int = 5) -> List[Dict]:
+def query_documents(queries: List[str], n_results: int) -> List[List[Dict]]:
+    """Run several searches against Chroma in one query call, one result list per query"""
     try:
         collection = get_or_create_collection()
         results = collection.query(
-            query_texts=[query],
+            query_texts=queries,
             n_results=n_results
         )
-        
+    except Exception:
+        reset_chroma_connection()
+        raise
+    
+    batches = []
+    for q in range(len(queries)):
         documents = []
         if results and results['documents']:
-            for i, doc in enumerate(results['documents'][0]):
+            for i, doc in enumerate(results['documents'][q]):
                 documents.append({
                     "text": doc,
-                    "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
-                    "distance": results['distances'][0][i] if results['distances'] else None
+                    "metadata": results['metadatas'][q][i] if results['metadatas'] else {},
+                    "distance": results['distances'][q][i] if results['distances'] else None
                 })
-        
-        return documents
+        batches.append(documents)
+    return batches
+
+async def search_docs(query: str, n_results: int = 5) -> List[Dict]:
+    if not query or not query.strip():
+        return []
+    n_results = min(max(n_results, 1), SEARCH_MAX_RESULTS)
+    
+    key = (query, n_results)
+    with _SEARCH_LOCK:
+        cached = _SEARCH_CACHE.get(key)
+        if cached is not None:
+            _search_cache_stats["hits"] += 1
+            return cached
+        _search_cache_stats["misses"] += 1
+    
+    future = asyncio.get_running_loop().create_future()
+    _search_queue.put_nowait((query, n_results, future))
+    return await future
+
+async def _run_search_batch(batch: List[Tuple[str, int, asyncio.Future]]):
+    """Query Chroma for one batch and resolve its callers' futures"""
+    with _SEARCH_LOCK:
+        generation = _search_generation
+    
+    # Ranked results are cut back to each caller's own n_results
+    max_n = max(n for _, n, _ in batch)
+    try:
+        results = await asyncio.to_thread(query_documents, [q for q, _, _ in batch], max_n)
     except Exception as e:
-        return [{"error": str(e)}]
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result([{"error": str(e)}])
+        return
+    
+    for (query, n, future), documents in zip(batch, results):
+        documents = documents[:n]
+        with _SEARCH_LOCK:
+            # Results computed before a document was added are returned but not cached
+            if _search_generation == generation:
+                _SEARCH_CACHE[(query, n)] = documents
+        if not future.done():
+            future.set_result(documents)
 
-def add_document(text: str, metadata: Dict = None) -> bool:
+async def search_batch_loop():
+    """Background task that collects concurrent searches and sends them to Chroma together"""
+    running = set()
+    try:
+        while True:
+            batch = [await _search_queue.get()]
+            deadline = asyncio.get_running_loop().time() + SEARCH_BATCH_WINDOW
+            while len(batch) < SEARCH_BATCH_SIZE:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(_search_queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Up to SEARCH_BATCH_CONCURRENCY batches query Chroma at once, so one slow query does not stall all searches
+            await _search_slots.acquire()
+            task = asyncio.create_task(_run_search_batch(batch))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: _search_slots.release())
+    finally:
+        for task in running:
+            task.cancel()
+
+class DocumentBufferFull(Exception):
+    """Raised by queue_document while DOCUMENT_BUFFER_SIZE documents are waiting"""
+
+
+# Value types Chroma accepts in document metadata
+_METADATA_TYPES = (str, int, float, bool)
+
+def clean_metadata(metadata: Optional[Dict]) -> Optional[Dict]:
+    """Reject metadata Chroma would refuse; empty metadata is stored as None"""
+    if not metadata:
+        return None
+    for key, value in metadata.items():
+        if not isinstance(value, _METADATA_TYPES):
+            raise ValueError(f"Metadata value for '{key}' must be a string, number or boolean")
+    return metadata
+
+def add_documents(documents: List[Tuple[str, Optional[Dict], str]]):
+    """Write (text, metadata, id) tuples to Chroma, one add call per metadata/no-metadata group"""
+    global _search_generation
+    
+    # Chroma validates metadatas as a whole, so documents without metadata go in a call of their own
+    with_metadata = [doc for doc in documents if doc[1]]
+    without_metadata = [doc for doc in documents if not doc[1]]
     try:
         collection = get_or_create_collection()
-        import uuid
-        doc_id = str(uuid.uuid4())
-        
-        collection.add(
-            documents=[text],
-            metadatas=[metadata or {}],
-            ids=[doc_id]
-        )
+        for group in (with_metadata, without_metadata):
+            if not group:
+                continue
+            collection.add(
+                documents=[text for text, _, _ in group],
+                metadatas=[metadata for _, metadata, _ in group] if group is with_metadata else None,
+                ids=[doc_id for _, _, doc_id in group]
+            )
+    except Exception:
+        reset_chroma_connection()
+        raise
+    
+    with _SEARCH_LOCK:
+        _SEARCH_CACHE.clear()
+        _search_generation += 1
+
+def chroma_available() -> bool:
+    """Heartbeat check used to tell an unreachable Chroma apart from rejected documents"""
+    try:
+        get_chroma_client().heartbeat()
         return True
-    except Exception as e:
-        print(f"Error adding document: {e}")
+    except Exception:
+        reset_chroma_connection()
         return False
 
+def queue_document(text: str, metadata: Dict = None) -> str:
+    """Buffer a document for the next batch write and return its ID"""
+    metadata = clean_metadata(metadata)
+    if len(_PENDING_DOCUMENTS) >= DOCUMENT_BUFFER_SIZE:
+        _flush_requested.set()
+        raise DocumentBufferFull(f"{len(_PENDING_DOCUMENTS)} documents are already waiting to be written")
+    
+    doc_id = str(uuid.uuid4())
+    _PENDING_DOCUMENTS.append((text, metadata, doc_id))
+    if len(_PENDING_DOCUMENTS) >= DOCUMENT_BATCH_SIZE:
+        _flush_requested.set()
+    return doc_id
+
+async def _write_documents_individually(batch: List[Tuple[str, Optional[Dict], str]]) -> int:
+    """Retry a failed batch one document at a time so a rejected document cannot block the rest"""
+    written = 0
+    failed = []
+    for doc in batch:
+        doc_id = doc[2]
+        try:
+            await asyncio.to_thread(add_documents, [doc])
+        except Exception as e:
+            attempts = _document_attempts.get(doc_id, 0) + 1
+            if attempts >= DOCUMENT_MAX_ATTEMPTS:
+                _document_attempts.pop(doc_id, None)
+                print(f"Dropping document {doc_id} after {attempts} failed attempts: {e}")
+            else:
+                _document_attempts[doc_id] = attempts
+                failed.append(doc)
+            continue
+        _document_attempts.pop(doc_id, None)
+        written += 1
+    
+    _PENDING_DOCUMENTS[:0] = failed
+    return written
+
+async def flush_documents() -> int:
+    """
+    Write all buffered documents to Chroma and return how many were written
+    
+    If the batch write fails while Chroma is reachable, the documents are retried one
+    by one. If Chroma is unreachable, the batch is re-queued unchanged and the error raised.
+    """
+    async with _FLUSH_LOCK:
+        if not _PENDING_DOCUMENTS:
+            return 0
+        
+        batch = _PENDING_DOCUMENTS[:]
+        _PENDING_DOCUMENTS.clear()
+        try:
+            await asyncio.to_thread(add_documents, batch)
+        except Exception as e:
+            if not await asyncio.to_thread(chroma_available):
+                _PENDING_DOCUMENTS[:0] = batch
+                raise
+            print(f"Batch write of {len(batch)} documents failed, retrying individually: {e}")
+            return await _write_documents_individually(batch)
+        
+        for _, _, doc_id in batch:
+            _document_attempts.pop(doc_id, None)
+        return len(batch)
+
+async def document_flush_loop():
+    """Background task that flushes buffered documents periodically or when a batch is full"""
+    while True:
+        try:
+            await asyncio.wait_for(_flush_requested.wait(), timeout=DOCUMENT_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _flush_requested.clear()
+        
+        try:
+            await flush_documents()
+        except Exception as e:
+            print(f"Error adding documents: {e}")
 
-def smarthome_list_devices(domain: str) -> Dict[str, Any]:
+
+def search_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters and current size of the search cache"""
+    with _SEARCH_LOCK:
+        return {
+            **_search_cache_stats,
+            "size": len(_SEARCH_CACHE),
+            "maxsize": _SEARCH_CACHE.maxsize,
+            "ttl": SEARCH_CACHE_TTL
+        }
+
+
+async def smarthome_list_devices(domain: str) -> Dict[str, Any]:
     """
     List all Smart Home devices of a specific type.
     
@@ -99,34 +383,34 @@ def smarthome_list_devices(domain: str) -> Dict[str, Any]:
         Dictionary with success status and list of devices
     """
     try:
-        response = requests.get(
-            f"{SMARTHOME_URL}/v1/entities",
-            params={"domain": domain},
-            timeout=10
+        response = await http_client.get(
+            _URL_ENTITIES,
+            params={"domain": domain}
         )
         response.raise_for_status()
         entities = response.json()
         
-        devices = []
-        for entity in entities:
-            devices.append({
-                "entity_id": entity.get("entity_id"),
-                "friendly_name": entity.get("friendly_name") or entity.get("entity_id"),
+        devices = [
+            {
+                "entity_id": (entity_id := entity.get("entity_id")),
+                "friendly_name": entity.get("friendly_name") or entity_id,
                 "state": entity.get("state")
-            })
+            }
+            for entity in entities
+        ]
         
         return {
             "success": True,
             "devices": devices,
             "count": len(devices)
         }
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         return {"success": False, "error": "Smart Home Service nicht erreichbar"}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-def smarthome_turn_on(entity_id: str) -> Dict[str, Any]:
+async def smarthome_turn_on(entity_id: str) -> Dict[str, Any]:
     """
     Turn on a Smart Home device.
     
@@ -137,10 +421,9 @@ def smarthome_turn_on(entity_id: str) -> Dict[str, Any]:
         Dictionary with success status and message
     """
     try:
-        response = requests.post(
-            f"{SMARTHOME_URL}/v1/actions/turn_on",
-            json={"entity_id": entity_id},
-            timeout=10
+        response = await http_client.post(
+            _URL_TURN_ON,
+            json={"entity_id": entity_id}
         )
         response.raise_for_status()
         result = response.json()
@@ -149,9 +432,9 @@ def smarthome_turn_on(entity_id: str) -> Dict[str, Any]:
             "success": result.get("success", False),
             "message": result.get("message", "Gerät eingeschaltet")
         }
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         return {"success": False, "error": "Smart Home Service nicht erreichbar"}
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
             return {"success": False, "error": f"Gerät '{entity_id}' nicht gefunden"}
         return {"success": False, "error": str(e)}
@@ -159,7 +442,7 @@ def smarthome_turn_on(entity_id: str) -> Dict[str, Any]:
         return {"success": False, "error": str(e)}
 
 
-def smarthome_turn_off(entity_id: str) -> Dict[str, Any]:
+async def smarthome_turn_off(entity_id: str) -> Dict[str, Any]:
     """
     Turn off a Smart Home device.
     
@@ -170,10 +453,9 @@ def smarthome_turn_off(entity_id: str) -> Dict[str, Any]:
         Dictionary with success status and message
     """
     try:
-        response = requests.post(
-            f"{SMARTHOME_URL}/v1/actions/turn_off",
-            json={"entity_id": entity_id},
-            timeout=10
+        response = await http_client.post(
+            _URL_TURN_OFF,
+            json={"entity_id": entity_id}
         )
         response.raise_for_status()
         result = response.json()
@@ -182,9 +464,9 @@ def smarthome_turn_off(entity_id: str) -> Dict[str, Any]:
             "success": result.get("success", False),
             "message": result.get("message", "Gerät ausgeschaltet")
         }
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         return {"success": False, "error": "Smart Home Service nicht erreichbar"}
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
             return {"success": False, "error": f"Gerät '{entity_id}' nicht gefunden"}
         return {"success": False, "error": str(e)}
@@ -192,7 +474,100 @@ def smarthome_turn_off(entity_id: str) -> Dict[str, Any]:
         return {"success": False, "error": str(e)}
 
 
-def smarthome_get_status(entity_id: str) -> Dict[str, Any]:
+# Human-readable German status texts for smarthome_get_status, dispatched by domain
+# and, for sensors, by device_class
+
+def _fmt_default(name: str, state: str, attributes: Dict) -> str:
+    return f"{name}: {state}"
+
+
+def _fmt_light(name: str, state: str, attributes: Dict) -> str:
+    if state != "on":
+        return f"{name} ist ausgeschaltet"
+    brightness = attributes.get("brightness")
+    if brightness:
+        return f"{name} ist eingeschaltet mit {round((brightness / 255) * 100)}% Helligkeit"
+    return f"{name} ist eingeschaltet"
+
+
+def _fmt_switch(name: str, state: str, attributes: Dict) -> str:
+    return f"{name} ist {'eingeschaltet' if state == 'on' else 'ausgeschaltet'}"
+
+
+_SENSOR_LABELS = {
+    "temperature": "Die Temperatur",
+    "humidity": "Die Luftfeuchtigkeit",
+    "battery": "Der Batteriestand",
+}
+
+
+def _fmt_sensor(name: str, state: str, attributes: Dict) -> str:
+    unit = attributes.get("unit_of_measurement", "")
+    label = _SENSOR_LABELS.get(attributes.get("device_class", ""))
+    if label:
+        return f"{label} ({name}) beträgt {state}{unit}"
+    return f"{name}: {state} {unit}".strip()
+
+
+def _fmt_motion(name: str, state: str) -> str:
+    return f"{name}: {'Bewegung erkannt' if state == 'on' else 'Keine Bewegung'}"
+
+
+def _fmt_opening(name: str, state: str) -> str:
+    return f"{name} ist {'offen' if state == 'on' else 'geschlossen'}"
+
+
+_BINARY_SENSOR_FORMATTERS = {
+    "motion": _fmt_motion,
+    "door": _fmt_opening,
+    "window": _fmt_opening,
+}
+
+
+def _fmt_binary_sensor(name: str, state: str, attributes: Dict) -> str:
+    fmt = _BINARY_SENSOR_FORMATTERS.get(attributes.get("device_class", ""))
+    return fmt(name, state) if fmt else f"{name}: {state}"
+
+
+_MEDIA_PLAYER_STATES = {
+    "paused": "ist pausiert",
+    "idle": "ist im Leerlauf",
+}
+
+
+def _fmt_media_player(name: str, state: str, attributes: Dict) -> str:
+    if state == "playing":
+        media_title = attributes.get("media_title", "")
+        if media_title:
+            return f"{name} spielt: {media_title}"
+        return f"{name} spielt gerade"
+    text = _MEDIA_PLAYER_STATES.get(state)
+    return f"{name} {text}" if text else f"{name}: {state}"
+
+
+def _fmt_climate(name: str, state: str, attributes: Dict) -> str:
+    current_temp = attributes.get("current_temperature")
+    target_temp = attributes.get("temperature")
+    hvac_mode = attributes.get("hvac_mode", state)
+    
+    if current_temp and target_temp:
+        return f"{name}: Aktuell {current_temp}°C, Ziel {target_temp}°C ({hvac_mode})"
+    if current_temp:
+        return f"{name}: Aktuell {current_temp}°C ({hvac_mode})"
+    return f"{name}: {hvac_mode}"
+
+
+_DOMAIN_FORMATTERS = {
+    "light": _fmt_light,
+    "switch": _fmt_switch,
+    "sensor": _fmt_sensor,
+    "binary_sensor": _fmt_binary_sensor,
+    "media_player": _fmt_media_player,
+    "climate": _fmt_climate,
+}
+
+
+async def smarthome_get_status(entity_id: str) -> Dict[str, Any]:
     """
     Get the status of a Smart Home device or sensor.
     
@@ -203,9 +578,8 @@ def smarthome_get_status(entity_id: str) -> Dict[str, Any]:
         Dictionary with success status and human-readable status description
     """
     try:
-        response = requests.get(
-            f"{SMARTHOME_URL}/v1/entities/{entity_id}",
-            timeout=10
+        response = await http_client.get(
+            f"{_URL_ENTITIES}/{entity_id}"
         )
         response.raise_for_status()
         entity = response.json()
@@ -213,74 +587,11 @@ def smarthome_get_status(entity_id: str) -> Dict[str, Any]:
         state = entity.get("state", "unknown")
         friendly_name = entity.get("friendly_name") or entity_id
         attributes = entity.get("attributes", {})
-        domain = entity_id.split(".")[0] if "." in entity_id else ""
-        
-        if domain == "light":
-            if state == "on":
-                brightness = attributes.get("brightness")
-                if brightness:
-                    brightness_pct = round((brightness / 255) * 100)
-                    status_text = f"{friendly_name} ist eingeschaltet mit {brightness_pct}% Helligkeit"
-                else:
-                    status_text = f"{friendly_name} ist eingeschaltet"
-            else:
-                status_text = f"{friendly_name} ist ausgeschaltet"
-        
-        elif domain == "switch":
-            status_text = f"{friendly_name} ist {'eingeschaltet' if state == 'on' else 'ausgeschaltet'}"
-        
-        elif domain == "sensor":
-            unit = attributes.get("unit_of_measurement", "")
-            device_class = attributes.get("device_class", "")
-            
-            if device_class == "temperature":
-                status_text = f"Die Temperatur ({friendly_name}) beträgt {state}{unit}"
-            elif device_class == "humidity":
-                status_text = f"Die Luftfeuchtigkeit ({friendly_name}) beträgt {state}{unit}"
-            elif device_class == "battery":
-                status_text = f"Der Batteriestand ({friendly_name}) beträgt {state}{unit}"
-            else:
-                status_text = f"{friendly_name}: {state} {unit}".strip()
-        
-        elif domain == "binary_sensor":
-            device_class = attributes.get("device_class", "")
-            if device_class == "motion":
-                status_text = f"{friendly_name}: {'Bewegung erkannt' if state == 'on' else 'Keine Bewegung'}"
-            elif device_class == "door":
-                status_text = f"{friendly_name} ist {'offen' if state == 'on' else 'geschlossen'}"
-            elif device_class == "window":
-                status_text = f"{friendly_name} ist {'offen' if state == 'on' else 'geschlossen'}"
-            else:
-                status_text = f"{friendly_name}: {state}"
+        prefix, dot, _ = entity_id.partition(".")
+        domain = prefix if dot else ""
         
-        elif domain == "media_player":
-            if state == "playing":
-                media_title = attributes.get("media_title", "")
-                if media_title:
-                    status_text = f"{friendly_name} spielt: {media_title}"
-                else:
-                    status_text = f"{friendly_name} spielt gerade"
-            elif state == "paused":
-                status_text = f"{friendly_name} ist pausiert"
-            elif state == "idle":
-                status_text = f"{friendly_name} ist im Leerlauf"
-            else:
-                status_text = f"{friendly_name}: {state}"
-        
-        elif domain == "climate":
-            current_temp = attributes.get("current_temperature")
-            target_temp = attributes.get("temperature")
-            hvac_mode = attributes.get("hvac_mode", state)
-            
-            if current_temp and target_temp:
-                status_text = f"{friendly_name}: Aktuell {current_temp}°C, Ziel {target_temp}°C ({hvac_mode})"
-            elif current_temp:
-                status_text = f"{friendly_name}: Aktuell {current_temp}°C ({hvac_mode})"
-            else:
-                status_text = f"{friendly_name}: {hvac_mode}"
-        
-        else:
-            status_text = f"{friendly_name}: {state}"
+        fmt = _DOMAIN_FORMATTERS.get(domain, _fmt_default)
+        status_text = fmt(friendly_name, state, attributes)
         
         return {
             "success": True,
@@ -290,9 +601,9 @@ def smarthome_get_status(entity_id: str) -> Dict[str, Any]:
             "attributes": attributes
         }
     
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         return {"success": False, "error": "Smart Home Service nicht erreichbar"}
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
             return {"success": False, "error": f"Gerät '{entity_id}' nicht gefunden"}
         return {"success": False, "error": str(e)}
@@ -300,113 +611,117 @@ def smarthome_get_status(entity_id: str) -> Dict[str, Any]:
         return {"success": False, "error": str(e)}
 
 
-def get_tool_definitions() -> List[Dict]:
-    return [
-        {
-            "name": "get_fact",
-            "description": "Ruft einen gespeicherten Fakt aus der Datenbank ab",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "key": {
-                        "type": "string",
-                        "description": "Der Schlüssel des Fakts (z.B. 'versicherung.gebaeude.summe')"
-                    }
-                },
-                "required": ["key"]
-            }
-        },
-        {
-            "name": "set_fact",
-            "description": "Speichert einen neuen Fakt in der Datenbank",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "key": {
-                        "type": "string",
-                        "description": "Der Schlüssel des Fakts"
-                    },
-                    "value": {
-                        "type": "string",
-                        "description": "Der Wert des Fakts"
-                    }
-                },
-                "required": ["key", "value"]
-            }
-        },
-        {
-            "name": "search_docs",
-            "description": "Durchsucht die Dokumentensammlung semantisch nach relevanten Informationen",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "Die Suchanfrage"
-                    },
-                    "n_results": {
-                        "type": "integer",
-                        "description": "Anzahl der Ergebnisse (Standard: 5)",
-                        "default": 5
-                    }
-                },
-                "required": ["query"]
-            }
-        },
-        {
-            "name": "smarthome_list_devices",
-            "description": "Listet alle verfügbaren Smart-Home-Geräte eines bestimmten Typs auf (z.B. 'light', 'switch', 'sensor', 'media_player'). Nutze dieses Tool, um herauszufinden, welche Geräte verfügbar sind.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "domain": {
-                        "type": "string",
-                        "description": "Der Gerätetyp (z.B. 'light' für Lichter, 'switch' für Schalter, 'sensor' für Sensoren, 'media_player' für Mediaplayer)"
-                    }
-                },
-                "required": ["domain"]
-            }
-        },
-        {
-            "name": "smarthome_turn_on",
-            "description": "Schaltet ein Smart-Home-Gerät ein (z.B. ein Licht oder einen Schalter). Benötigt die entity_id des Geräts.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "entity_id": {
-                        "type": "string",
-                        "description": "Die Entity-ID des Geräts (z.B. 'light.wohnzimmer', 'switch.steckdose_1')"
-                    }
-                },
-                "required": ["entity_id"]
-            }
-        },
-        {
-            "name": "smarthome_turn_off",
-            "description": "Schaltet ein Smart-Home-Gerät aus. Benötigt die entity_id des Geräts.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "entity_id": {
-                        "type": "string",
-                        "description": "Die Entity-ID des Geräts (z.B. 'light.wohnzimmer', 'switch.steckdose_1')"
-                    }
+# Built once at import; the definitions never change at runtime
+_TOOL_DEFS: List[Dict] = [
+    {
+        "name": "get_fact",
+        "description": "Ruft einen gespeicherten Fakt aus der Datenbank ab",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "key": {
+                    "type": "string",
+                    "description": "Der Schlüssel des Fakts (z.B. 'versicherung.gebaeude.summe')"
+                }
+            },
+            "required": ["key"]
+        }
+    },
+    {
+        "name": "set_fact",
+        "description": "Speichert einen neuen Fakt in der Datenbank",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "key": {
+                    "type": "string",
+                    "description": "Der Schlüssel des Fakts"
                 },
-                "required": ["entity_id"]
-            }
-        },
-        {
-            "name": "smarthome_get_status",
-            "description": "Fragt den aktuellen Zustand eines Smart-Home-Geräts oder Sensors ab (z.B. 'ist das Licht an?', 'wie ist die Temperatur?'). Gibt eine menschenlesbare Zusammenfassung zurück.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "entity_id": {
-                        "type": "string",
-                        "description": "Die Entity-ID des Geräts oder Sensors (z.B. 'light.wohnzimmer', 'sensor.temperatur_aussen')"
-                    }
+                "value": {
+                    "type": "string",
+                    "description": "Der Wert des Fakts"
+                }
+            },
+            "required": ["key", "value"]
+        }
+    },
+    {
+        "name": "search_docs",
+        "description": "Durchsucht die Dokumentensammlung semantisch nach relevanten Informationen",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Die Suchanfrage"
                 },
-                "required": ["entity_id"]
-            }
+                "n_results": {
+                    "type": "integer",
+                    "description": "Anzahl der Ergebnisse (Standard: 5)",
+                    "default": 5
+                }
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "smarthome_list_devices",
+        "description": "Listet alle verfügbaren Smart-Home-Geräte eines bestimmten Typs auf (z.B. 'light', 'switch', 'sensor', 'media_player'). Nutze dieses Tool, um herauszufinden, welche Geräte verfügbar sind.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "domain": {
+                    "type": "string",
+                    "description": "Der Gerätetyp (z.B. 'light' für Lichter, 'switch' für Schalter, 'sensor' für Sensoren, 'media_player' für Mediaplayer)"
+                }
+            },
+            "required": ["domain"]
+        }
+    },
+    {
+        "name": "smarthome_turn_on",
+        "description": "Schaltet ein Smart-Home-Gerät ein (z.B. ein Licht oder einen Schalter). Benötigt die entity_id des Geräts.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "entity_id": {
+                    "type": "string",
+                    "description": "Die Entity-ID des Geräts (z.B. 'light.wohnzimmer', 'switch.steckdose_1')"
+                }
+            },
+            "required": ["entity_id"]
+        }
+    },
+    {
+        "name": "smarthome_turn_off",
+        "description": "Schaltet ein Smart-Home-Gerät aus. Benötigt die entity_id des Geräts.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "entity_id": {
+                    "type": "string",
+                    "description": "Die Entity-ID des Geräts (z.B. 'light.wohnzimmer', 'switch.steckdose_1')"
+                }
+            },
+            "required": ["entity_id"]
         }
-    ]
+    },
+    {
+        "name": "smarthome_get_status",
+        "description": "Fragt den aktuellen Zustand eines Smart-Home-Geräts oder Sensors ab (z.B. 'ist das Licht an?', 'wie ist die Temperatur?'). Gibt eine menschenlesbare Zusammenfassung zurück.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "entity_id": {
+                    "type": "string",
+                    "description": "Die Entity-ID des Geräts oder Sensors (z.B. 'light.wohnzimmer', 'sensor.temperatur_aussen')"
+                }
+            },
+            "required": ["entity_id"]
+        }
+    }
+]
+
+
+def get_tool_definitions() -> List[Dict]:
+    return _TOOL_DEFS